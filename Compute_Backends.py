@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import numpy as np
+from scipy import fft as sp_fft
+from scipy.signal import convolve2d
+
+# Registry of compute backends: name -> class. The simulator routes its convolutions,
+# lateral beam (PSF) math and masked metric reductions through one of these.
+BACKENDS = {}
+REFERENCE_BACKEND = 'scipy-direct'
+DEFAULT_BACKEND = 'scipy-fft' #library default; 'auto' (benchmark on first run) is opted into by the CLI entry points
+BENCHMARK_TILE = 256 #benchmark image size cap: ranks the backends without full-grid reference convolutions
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'us_simulator', 'backends.json')
+
+
+def register_backend(cls):
+    BACKENDS[cls.name] = cls
+    return cls
+
+
+def available_backends():
+    return list(BACKENDS)
+
+
+def get_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown compute backend {name!r} (available: {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
+
+
+class ComputeBackend: #numpy implementations; subclasses override what they accelerate
+    name = None
+    spectral = False #convolve_many is a SpectralConvolver -> callers may reuse image / kernel spectra
+
+    def convolve(self, image, psf, mode='same'): #2D convolution, zero padded, scipy.signal semantics
+        raise NotImplementedError
+
+    def convolve_many(self, image, psfs, mode='same'): #(..., kh, kw) kernels -> (..., rows, cols), one image
+        psfs = np.asarray(psfs)
+        flat = [self.convolve(image, psf, mode) for psf in psfs.reshape((-1,) + psfs.shape[-2:])]
+        return np.stack(flat).reshape(psfs.shape[:-2] + flat[0].shape)
+
+    def psf_beam(self, r, width, sl_amp, power_factor=None): #lateral beam: main lobe + side lobes (+ harmonic power)
+        beam = np.sinc(r / width) + sl_amp * np.exp(-(r - 3)**2) * np.cos(2*np.pi*r)
+        if power_factor is not None:
+            beam = np.sign(beam) * (np.abs(beam) ** power_factor)
+        return beam
+
+    def region_stats(self, img_db, mask): #mean & std of the linearized dB image over mask
+        vals = 10**(img_db[mask] / 20)
+        return np.mean(vals), np.std(vals)
+
+
+@register_backend
+class ScipyDirectBackend(ComputeBackend): #reference: direct-sum convolution
+    name = 'scipy-direct'
+
+    def convolve(self, image, psf, mode='same'):
+        return convolve2d(image, psf, mode=mode)
+
+
+def _crop(out, shape, k_shape, mode): #full linear convolution (..., >= h+kh-1, >= w+kw-1) -> scipy mode
+    (h, w), (kh, kw) = shape, k_shape
+    if mode == 'same':
+        r0, c0 = (kh - 1) // 2, (kw - 1) // 2
+        return out[..., r0:r0 + h, c0:c0 + w].copy()
+    if mode == 'valid':
+        return out[..., kh - 1:h, kw - 1:w].copy()
+    return out[..., :h + kh - 1, :w + kw - 1].copy()
+
+
+class SpectralConvolver: #one image spectrum reused for batches of kernels (batched FFT convolution)
+    def __init__(self, image, k_shape):
+        self.shape = image.shape
+        self.k_shape = tuple(k_shape)
+        full = (self.shape[0] + self.k_shape[0] - 1, self.shape[1] + self.k_shape[1] - 1)
+        self.fshape = tuple(sp_fft.next_fast_len(n, real=True) for n in full)
+        self.spectrum = sp_fft.rfft2(image, self.fshape, workers=-1)
+
+    def kernel_spectra(self, psfs): #(..., kh, kw) kernels -> (..., fh, fw//2+1) spectra
+        # rows first over the kh kernel rows only, then the zero-padded columns (~half a full-size rfft2)
+        rows = sp_fft.rfft(np.asarray(psfs), self.fshape[1], axis=-1, workers=-1)
+        return sp_fft.fft(rows, self.fshape[0], axis=-2, workers=-1)
+
+    def convolve_spectra(self, spectra, mode='same'): #one inverse FFT per kernel, image spectrum shared
+        out = sp_fft.irfft2(self.spectrum * spectra, self.fshape, axes=(-2, -1), workers=-1)
+        return _crop(out, self.shape, self.k_shape, mode)
+
+    def convolve(self, psfs, mode='same'):
+        return self.convolve_spectra(self.kernel_spectra(psfs), mode)
+
+
+@register_backend
+class ScipyFFTBackend(ComputeBackend): #real FFTs padded to fast lengths, all cores
+    name = 'scipy-fft'
+    spectral = True
+
+    def convolve(self, image, psf, mode='same'):
+        return SpectralConvolver(image, psf.shape).convolve(psf, mode)
+
+    def convolve_many(self, image, psfs, mode='same'): #image spectrum computed once for all kernels
+        psfs = np.asarray(psfs)
+        return SpectralConvolver(image, psfs.shape[-2:]).convolve(psfs, mode)
+
+
+try:
+    import numba
+except ImportError: #optional dependency
+    numba = None
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _numba_convolve_valid(padded, psf):
+        kh, kw = psf.shape
+        h, w = padded.shape[0] - kh + 1, padded.shape[1] - kw + 1
+        out = np.zeros((h, w))
+        for i in numba.prange(h):
+            for a in range(kh):
+                for b in range(kw):
+                    k = psf[kh - 1 - a, kw - 1 - b] #flipped kernel -> convolution
+                    if k != 0.0:
+                        for j in range(w):
+                            out[i, j] += k * padded[i + a, j + b]
+        return out
+
+    @numba.njit(cache=True)
+    def _numba_region_stats(img_db, mask):
+        n, s, s2 = 0, 0.0, 0.0
+        for i in range(img_db.shape[0]):
+            for j in range(img_db.shape[1]):
+                if mask[i, j]:
+                    v = 10.0**(img_db[i, j] / 20.0)
+                    n += 1
+                    s += v
+                    s2 += v * v
+        mean = s / n
+        return mean, np.sqrt(max(s2 / n - mean * mean, 0.0))
+
+    @register_backend
+    class NumbaBackend(ComputeBackend): #JIT-compiled direct convolution (only when Numba is installed)
+        name = 'numba'
+
+        def convolve(self, image, psf, mode='same'):
+            kh, kw = psf.shape
+            if mode == 'same':
+                pads = (kh // 2, (kh - 1) // 2), (kw // 2, (kw - 1) // 2)
+            elif mode == 'valid':
+                pads = ((0, 0), (0, 0))
+            else:
+                pads = ((kh - 1, kh - 1), (kw - 1, kw - 1))
+            padded = np.pad(np.asarray(image, dtype=np.float64), pads)
+            return _numba_convolve_valid(padded, np.ascontiguousarray(psf, dtype=np.float64))
+
+        def region_stats(self, img_db, mask):
+            return _numba_region_stats(np.ascontiguousarray(img_db, dtype=np.float64), np.ascontiguousarray(mask))
+
+
+def benchmark_backends(grid_size, kernel_size=41, repeat=3): #-> {name: seconds or None if failed verification}
+    n = min(grid_size, BENCHMARK_TILE)
+    rng = np.random.RandomState(0)
+    image = np.abs(rng.normal(0, 1.0, (n, n)))
+    psf = rng.normal(0, 1.0, (kernel_size, kernel_size)) / kernel_size**2
+    psfs = np.stack([psf, psf[::-1]]) #harmonic frames convolve kernel batches
+    img_db = np.clip(20 * np.log10(image / image.max() + 1e-6), -60, 0)
+    mask = image > 0.5
+
+    ref = get_backend(REFERENCE_BACKEND)
+    t0 = time.perf_counter()
+    ref_conv = ref.convolve(image, psf)
+    ref_many = ref.convolve_many(image, psfs)
+    ref_stats = ref.region_stats(img_db, mask)
+    scale = np.max(np.abs(ref_conv))
+    results = {REFERENCE_BACKEND: time.perf_counter() - t0} #plain direct sums (nothing to warm up) -> timed once
+    fastest = results[REFERENCE_BACKEND]
+
+    for name in BACKENDS:
+        if name == REFERENCE_BACKEND:
+            continue
+        backend = get_backend(name)
+        try:
+            conv = backend.convolve(image, psf) #also warms up JIT backends
+            many = backend.convolve_many(image, psfs)
+            stats = backend.region_stats(img_db, mask)
+            ok = (np.allclose(conv, ref_conv, rtol=1e-7, atol=1e-9 * scale) and np.allclose(stats, ref_stats, rtol=1e-7)
+                  and np.allclose(many, ref_many, rtol=1e-7, atol=1e-9 * scale))
+        except Exception:
+            ok = False
+        if not ok:
+            results[name] = None
+            continue
+        best = np.inf #warm, best of `repeat`
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            backend.convolve(image, psf)
+            backend.convolve_many(image, psfs)
+            backend.region_stats(img_db, mask)
+            best = min(best, time.perf_counter() - t0)
+            if best > fastest: #already slower than the best so far -> no need to time it again
+                break
+        results[name] = best
+        fastest = min(fastest, best)
+    return results
+
+
+def select_backend(grid_size, cache_path=None): #fastest verified backend for this grid, benchmarked once & persisted
+    cache_path = cache_path or os.environ.get('US_SIM_BACKEND_CACHE', DEFAULT_CACHE_PATH)
+    try:
+        with open(cache_path, 'r') as f:
+            choices = json.load(f)
+    except (OSError, ValueError):
+        choices = {}
+
+    name = choices.get(str(grid_size))
+    if name in BACKENDS:
+        return get_backend(name)
+
+    timings = benchmark_backends(grid_size)
+    valid = {k: v for k, v in timings.items() if v is not None}
+    name = min(valid, key=valid.get) if valid else REFERENCE_BACKEND
+    choices[str(grid_size)] = name
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'w') as f:
+            json.dump(choices, f, indent=2)
+    except OSError: #read-only home etc. -> benchmark again next run
+        pass
+    return get_backend(name)
@@ -148,7 +148,7 @@ class ControlPanel(QWidget):
         
         self.pi_check = QCheckBox("Pulse Inversion\n(Clean Harmonics)")
         self.pi_check.setChecked(False)
-        self.pi_check.setToolTip("Enables Summation Gain (2x Signal, 1.4x Noise)")
+        self.pi_check.setToolTip("Dual transmit (+/- pulse): harmonics add (2x signal, 1.4x noise), fundamental cancels")
         self.pi_check.setStyleSheet("""
             QCheckBox {
                 font-weight: 600;
@@ -173,6 +173,18 @@ class ControlPanel(QWidget):
             }
         """)
         checkbox_layout.addWidget(self.pi_check, 0, Qt.AlignCenter)
+        
+        self.scan_check = QCheckBox("Scan-Line Rendering\n(Progressive Display)")
+        self.scan_check.setChecked(False)
+        self.scan_check.setToolTip("Builds the image in lateral column blocks and shows each block as soon as it is ready")
+        self.scan_check.setStyleSheet(self.pi_check.styleSheet())
+        checkbox_layout.addWidget(self.scan_check, 0, Qt.AlignCenter)
+        
+        self.compound_check = QCheckBox("Spatial Compounding\n(-10\u00b0, 0\u00b0, +10\u00b0)")
+        self.compound_check.setChecked(False)
+        self.compound_check.setToolTip("Averages envelopes of 3 steered frames to suppress speckle")
+        self.compound_check.setStyleSheet(self.pi_check.styleSheet())
+        checkbox_layout.addWidget(self.compound_check, 0, Qt.AlignCenter)
         checkbox_container.setLayout(checkbox_layout)
         grid.addWidget(checkbox_container, 1, 0, 1, 2)
         
@@ -181,6 +193,7 @@ class ControlPanel(QWidget):
         
         #status
         self.status = QLabel("Ready")
+        self.status.setWordWrap(True) #error messages
         self.status.setAlignment(Qt.AlignCenter)
         self.status.setStyleSheet("""
             QLabel {
@@ -195,6 +208,46 @@ class ControlPanel(QWidget):
         """)
         layout.addWidget(self.status)
         
+        #latency (slider -> pixels)
+        self.latency_lbl = QLabel("Latency p50 / p95 / p99: -- ms")
+        self.latency_lbl.setAlignment(Qt.AlignCenter)
+        self.latency_lbl.setToolTip("End-to-end delay from slider input to painted image")
+        self.latency_lbl.setStyleSheet("""
+            QLabel {
+                font-size: 12px;
+                font-weight: 600;
+                color: #34495e;
+                padding: 6px;
+            }
+        """)
+        layout.addWidget(self.latency_lbl)
+        
+        self.latency_btn = QPushButton("Export Latency Histogram")
+        self.latency_btn.setStyleSheet("""
+            QPushButton {
+                font-size: 12px;
+                font-weight: 600;
+                color: white;
+                background: #3498db;
+                border: 1px solid #2980b9;
+                border-radius: 6px;
+                padding: 8px;
+            }
+            QPushButton:hover {
+                background: #5dade2;
+            }
+        """)
+        layout.addWidget(self.latency_btn)
+        
+        #session snapshots
+        snap_row = QHBoxLayout()
+        self.save_btn = QPushButton("Save Snapshot")
+        self.load_btn = QPushButton("Load Snapshot")
+        for btn in (self.save_btn, self.load_btn):
+            btn.setStyleSheet(self.latency_btn.styleSheet())
+            snap_row.addWidget(btn)
+        layout.addLayout(snap_row)
+        
         layout.addStretch()
         self.setLayout(layout)
         
@@ -202,6 +255,19 @@ class ControlPanel(QWidget):
         self.freq_slider.valueChanged.connect(lambda v: self.freq_lbl.setText(f"{v/10:.1f} MHz"))
         self.nl_slider.valueChanged.connect(lambda v: self.nl_lbl.setText(f"{v/100:.2f}"))
         
+    def setParameters(self, freq_value, nl_value, pi, compound=False): #set controls without triggering updates
+        widgets = (self.freq_slider, self.nl_slider, self.pi_check, self.compound_check)
+        for w in widgets:
+            w.blockSignals(True)
+        self.freq_slider.setValue(freq_value)
+        self.nl_slider.setValue(nl_value)
+        self.pi_check.setChecked(pi)
+        self.compound_check.setChecked(compound)
+        for w in widgets:
+            w.blockSignals(False)
+        self.freq_lbl.setText(f"{freq_value/10:.1f} MHz")
+        self.nl_lbl.setText(f"{nl_value/100:.2f}")
+        
     def setStatusUpdating(self):
         self.status.setText("Updating...")
         self.status.setStyleSheet("""
@@ -216,6 +282,20 @@ class ControlPanel(QWidget):
             }
         """)
     
+    def setStatusError(self, message):
+        self.status.setText(message)
+        self.status.setStyleSheet("""
+            QLabel {
+                font-size: 12px;
+                font-weight: 600;
+                color: #e74c3c;
+                padding: 10px;
+                background: #fdedec;
+                border-radius: 6px;
+                border: 1px solid #e74c3c;
+            }
+        """)
+        
     def setStatusReady(self):
         self.status.setText("Ready")
         self.status.setStyleSheet("""
@@ -228,4 +308,18 @@ class ControlPanel(QWidget):
                 border-radius: 6px;
                 border: 1px solid #27ae60;
             }
+        """)
+    
+    def setLatency(self, stats, budget_ms):
+        if not stats:
+            return
+        color = '#c0392b' if stats['p95'] > budget_ms else '#27ae60' #p95 against the latency budget
+        self.latency_lbl.setText(f"Latency p50 / p95 / p99: {stats['p50']:.0f} / {stats['p95']:.0f} / {stats['p99']:.0f} ms")
+        self.latency_lbl.setStyleSheet(f"""
+            QLabel {{
+                font-size: 12px;
+                font-weight: 600;
+                color: {color};
+                padding: 6px;
+            }}
         """)
\ No newline at end of file
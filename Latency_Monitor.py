@@ -0,0 +1,86 @@
+import time
+from collections import deque
+import numpy as np
+
+
+class LatencyMonitor: #input event -> painted pixels latency, rolling percentiles & per-stage breakdown
+    def __init__(self, window=500, budget_ms=250.0):
+        self.budget_ms = budget_ms
+        self.samples = deque(maxlen=window) #end-to-end latencies (ms)
+        self.stages = {} #stage name -> deque of durations (ms)
+        self.window = window
+        self._t_input = None #latest input whose result is not on screen yet
+        self._t_last = None #previous stage boundary
+        self._armed = False #frame finished, waiting for its paint
+
+    def mark_input(self): #slider / checkbox changed (the latest input is the one the user waits for)
+        self._t_input = time.perf_counter()
+        self._t_last = self._t_input
+        self._armed = False
+
+    def mark_stage(self, name): #duration since the previous mark (debounce, simulation, draw ...)
+        if self._t_input is None:
+            return
+        now = time.perf_counter()
+        self.stages.setdefault(name, deque(maxlen=self.window)).append((now - self._t_last) * 1e3)
+        self._t_last = now
+
+    def arm(self): #frame is drawn into the canvas buffer, the next paint puts it on screen
+        if self._t_input is not None:
+            self._armed = True
+
+    def mark_painted(self): #paint completion -> one end-to-end sample
+        if not self._armed:
+            return None
+        self.mark_stage('paint')
+        latency = (self._t_last - self._t_input) * 1e3
+        self.samples.append(latency)
+        self._t_input = None
+        self._armed = False
+        return latency
+
+    def percentiles(self): #-> {'p50', 'p95', 'p99', 'over_budget', 'n'} or None
+        if not self.samples:
+            return None
+        data = np.fromiter(self.samples, dtype=float)
+        p50, p95, p99 = np.percentile(data, [50, 95, 99])
+        return {'p50': p50, 'p95': p95, 'p99': p99,
+                'over_budget': float(np.mean(data > self.budget_ms)), 'n': len(data)}
+
+    def stage_means(self):
+        return {k: float(np.mean(v)) for k, v in self.stages.items() if v}
+
+    def histogram(self, bin_ms=10.0):
+        data = np.fromiter(self.samples, dtype=float)
+        top = max(bin_ms, np.ceil(data.max() / bin_ms) * bin_ms) if len(data) else bin_ms
+        return np.histogram(data, bins=np.arange(0.0, top + bin_ms, bin_ms))
+
+    def export_histogram(self, path, bin_ms=10.0): #.png -> plot, anything else -> CSV
+        counts, edges = self.histogram(bin_ms)
+        stats = self.percentiles() or {}
+        if path.lower().endswith('.png'):
+            from matplotlib.figure import Figure
+            fig = Figure(figsize=(6, 4), dpi=100)
+            ax = fig.add_subplot(111)
+            ax.bar(edges[:-1], counts, width=bin_ms, align='edge', color='#3498db', edgecolor='#2980b9')
+            for key, color in (('p50', '#27ae60'), ('p95', '#f39c12'), ('p99', '#e74c3c')):
+                if key in stats:
+                    ax.axvline(stats[key], color=color, linestyle='--', label=f"{key} {stats[key]:.0f} ms")
+            ax.axvline(self.budget_ms, color='#2c3e50', linewidth=2, label=f"budget {self.budget_ms:.0f} ms")
+            ax.set_xlabel('Slider-to-pixel latency [ms]')
+            ax.set_ylabel('Count')
+            ax.legend()
+            fig.tight_layout()
+            fig.savefig(path)
+            return
+
+        with open(path, 'w') as f:
+            for key in ('n', 'p50', 'p95', 'p99', 'over_budget'):
+                if key in stats:
+                    f.write(f"# {key}: {stats[key]:.3f}\n")
+            f.write(f"# budget_ms: {self.budget_ms:.1f}\n")
+            for name, mean in self.stage_means().items():
+                f.write(f"# stage_mean_ms {name}: {mean:.3f}\n")
+            f.write("bin_start_ms,bin_end_ms,count\n")
+            for lo, hi, c in zip(edges[:-1], edges[1:], counts):
+                f.write(f"{lo:.1f},{hi:.1f},{c}\n")
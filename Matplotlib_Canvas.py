@@ -1,20 +1,130 @@
+import numpy as np
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 from PyQt5.QtWidgets import *
 
+
+def block_reduce(image, fy, fx): #anti-aliased decimation of a dB image: mean amplitude over fy x fx blocks (remainder cropped)
+    h, w = image.shape[0] // fy, image.shape[1] // fx
+    amp = 10.0 ** (image[:h*fy, :w*fx] / 20.0) #average echoes, not decibels (a dB mean under-reads bright speckle)
+    return 20.0 * np.log10(amp.reshape(h, fy, w, fx).mean(axis=(1, 3)))
+
+
+def decimation_factor(n_px, n_display): #largest power of two keeping >= 1 image pixel per screen pixel
+    f = 1
+    while n_display > 0 and n_px // (f * 2) >= n_display:
+        f *= 2
+    return f
+
+
 class MatplotlibCanvas(FigureCanvas):
     def __init__(self, parent=None, width=5, height=4, dpi=100):
+        # Display-resolution pyramids: slot -> {(fy, fx): decimated image}, (1, 1) = full resolution.
+        # Rebuilt when a new image is plotted, reused across resizes / redraws.
+        self._pyramids = {}
+        self._artists = {} #slot -> (AxesImage, Axes, current factors)
+        self.paint_callbacks = [] #called after each completed paint (latency monitoring)
+        self._scan = {} #slot -> full-resolution frame being filled by update_scan
+        self._drawn_size = None #canvas size of the last full draw (the Agg buffer blits are drawn into)
+        
         self.fig = Figure(figsize=(width, height), dpi=dpi, facecolor='white')
         super().__init__(self.fig)
         self.setParent(parent)
         self.ax = self.fig.add_subplot(111)
         
+    def _pyramid_level(self, slot, fy, fx):
+        levels = self._pyramids[slot]
+        if (fy, fx) not in levels:
+            # reduce from the coarsest cached level that divides the requested factors
+            ky, kx = max((k for k in levels if fy % k[0] == 0 and fx % k[1] == 0), key=lambda k: k[0] * k[1])
+            levels[(fy, fx)] = block_reduce(levels[(ky, kx)], fy // ky, fx // kx)
+        return levels[(fy, fx)]
+    
+    def _display_factors(self, ax, image):
+        bbox = ax.get_window_extent() #axes size in device pixels
+        return decimation_factor(image.shape[0], int(bbox.height)), decimation_factor(image.shape[1], int(bbox.width))
+    
+    def _show_image(self, ax, slot, image, **kwargs): #imshow a display-sized pyramid level of image
+        self._pyramids[slot] = {(1, 1): image}
+        fy, fx = self._display_factors(ax, image)
+        h, w = image.shape
+        im = ax.imshow(self._pyramid_level(slot, fy, fx), extent=(-0.5, w - 0.5, h - 0.5, -0.5), **kwargs)
+        self._artists[slot] = (im, ax, (fy, fx))
+        return im
+    
+    def resizeEvent(self, event): #pick the pyramid level matching the new canvas size
+        super().resizeEvent(event)
+        if self._refit_images():
+            self.draw_idle()
+    
+    def _refit_images(self): #re-measure every axes (after layout / resize) -> True if a level changed
+        changed = False
+        for slot, (im, ax, factors) in self._artists.items():
+            image = self._pyramids[slot][(1, 1)]
+            new_factors = self._display_factors(ax, image)
+            if new_factors != factors:
+                im.set_data(self._pyramid_level(slot, *new_factors))
+                self._artists[slot] = (im, ax, new_factors)
+                changed = True
+        return changed
+        
+    def draw(self):
+        super().draw()
+        self._drawn_size = self.get_width_height()
+        
+    def begin_scan(self, shape): #empty (black) comparison frame filled block by block with update_scan
+        self._scan = {'fundamental': np.full(shape, -60.0), 'harmonic': np.full(shape, -60.0)}
+        reuse = (self._drawn_size == self.get_width_height() and
+                 all(s in self._pyramids and self._pyramids[s][(1, 1)].shape == shape for s in self._scan))
+        if not reuse: #first scan / new grid / resized: lay the figure out once
+            self.plot_comparison(self._scan['fundamental'], self._scan['harmonic'])
+            return
+        for slot, frame in self._scan.items(): #same layout on screen: only swap the image data
+            im, ax, (fy, fx) = self._artists[slot]
+            self._pyramids[slot] = {(1, 1): frame}
+            if (fy, fx) != (1, 1):
+                self._pyramids[slot][(fy, fx)] = np.full((shape[0] // fy, shape[1] // fx), -60.0)
+            im.set_data(self._pyramids[slot][(fy, fx)])
+        self._blit_images()
+        
+    def update_scan(self, c0, c1, fund_block, harm_block): #write columns [c0, c1) and paint them now
+        for slot, block in (('fundamental', fund_block), ('harmonic', harm_block)):
+            frame = self._scan[slot]
+            frame[:, c0:c1] = block
+            im, ax, (fy, fx) = self._artists[slot]
+            levels = self._pyramids[slot]
+            level = levels[(fy, fx)]
+            for k in [k for k in levels if k not in ((1, 1), (fy, fx))]: #other levels are stale now
+                del levels[k]
+            if (fy, fx) != (1, 1): #re-reduce only the decimated columns touched by this block
+                d0, d1 = c0 // fx, min(-(-c1 // fx), level.shape[1])
+                level[:, d0:d1] = block_reduce(frame[:level.shape[0] * fy, d0 * fx:d1 * fx], fy, fx)
+            im.set_data(level)
+        self._blit_images()
+        
+    def _blit_images(self): #redraw only the image artists (+ their frames) into the last full draw
+        for im, ax, _ in self._artists.values():
+            ax.draw_artist(im)
+            for spine in ax.spines.values(): #the image covers the inner half of each spine
+                ax.draw_artist(spine)
+            self.blit(ax.bbox) #synchronous repaint of that rectangle, no event processing
+        
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        for cb in self.paint_callbacks:
+            cb()
+        
+    def _reset_images(self):
+        self._pyramids = {}
+        self._artists = {}
+        
     def plot_image(self, image, title, vmin=-60, vmax=0):
         self.fig.clear()
+        self._reset_images()
         ax = self.fig.add_subplot(111)
         
         if image is not None:
-            im = ax.imshow(image, cmap='gray', vmin=vmin, vmax=vmax, aspect='auto')
+            im = self._show_image(ax, 'image', image, cmap='gray', vmin=vmin, vmax=vmax, aspect='auto')
             ax.set_title(title, fontweight='bold', fontsize=12, color='#2c3e50', pad=10)
             ax.set_xlabel("Lateral", fontsize=10, fontweight='600', color='#34495e')
             ax.set_ylabel("Depth", fontsize=10, fontweight='600', color='#34495e')
@@ -30,17 +140,19 @@ class MatplotlibCanvas(FigureCanvas):
             ax.tick_params(colors='#34495e', labelsize=9)
         
         self.fig.tight_layout()
+        self._refit_images() #colorbar / tight_layout shrank the axes after _show_image measured them
         self.draw()
 
     def plot_comparison(self, img_fund, img_harm):
         self.fig.clear()
+        self._reset_images()
         
         self.fig.subplots_adjust(left=0.08, right=0.88, wspace=0.15)
         
         # Fund
         ax1 = self.fig.add_subplot(121)
         if img_fund is not None:
-            im1 = ax1.imshow(img_fund, cmap='gray', vmin=-60, vmax=0, aspect='auto')
+            im1 = self._show_image(ax1, 'fundamental', img_fund, cmap='gray', vmin=-60, vmax=0, aspect='auto')
             ax1.set_title("Fundamental", fontweight='bold', fontsize=12, 
                          color='#3498db', pad=10)
             ax1.set_xlabel("Lateral", fontsize=10, fontweight='600', color='#34495e')
@@ -56,7 +168,7 @@ class MatplotlibCanvas(FigureCanvas):
         # Harm
         ax2 = self.fig.add_subplot(122)
         if img_harm is not None:
-            im2 = ax2.imshow(img_harm, cmap='gray', vmin=-60, vmax=0, aspect='auto')
+            im2 = self._show_image(ax2, 'harmonic', img_harm, cmap='gray', vmin=-60, vmax=0, aspect='auto')
             ax2.set_title("Harmonic", fontweight='bold', fontsize=12, 
                          color='#e74c3c', pad=10)
             ax2.set_xlabel("Lateral", fontsize=10, fontweight='600', color='#34495e')
@@ -74,4 +186,5 @@ class MatplotlibCanvas(FigureCanvas):
             cbar.set_label("dB", fontsize=10, fontweight='600', color='#34495e')
             cbar.ax.tick_params(labelsize=9, colors='#34495e')
             
+        self._refit_images() #the shared colorbar shrank both axes after _show_image measured them
         self.draw()
\ No newline at end of file
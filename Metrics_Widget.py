@@ -25,12 +25,14 @@ class MetricsWidget(QWidget):
         self.table = QTableWidget(4, 2) 
         self.table.setHorizontalHeaderLabels(["Fundamental", "Harmonic"])
         
-        self.table.setVerticalHeaderLabels([
+        self.row_labels = [
             "Lateral Res (mm)", 
             "Side-Lobes (dB)", 
             "CNR", 
             "SNR"
-        ])
+        ]
+        self.compound_labels = ["CNR Compound (gain)", "SNR Compound (gain)"]
+        self.table.setVerticalHeaderLabels(self.row_labels)
         
 
         self.table.setStyleSheet("""
@@ -105,12 +107,25 @@ class MetricsWidget(QWidget):
         set_item(1, 0, f"{f_sl:.1f}")
         set_item(1, 1, f"{h_sl:.1f}", QColor(165, 214, 167) if h_sl < f_sl else None)
         
-        # 3. CNR (Higher is better)
-        f_cnr, h_cnr = m['fund_cnr'], m['harm_cnr']
-        set_item(2, 0, f"{f_cnr:.2f}")
-        set_item(2, 1, f"{h_cnr:.2f}", QColor(165, 214, 167) if h_cnr > f_cnr else None)
+        # 3. CNR (Higher is better) - n/a without a usable cyst ROI (NaN / missing)
+        fmt = lambda v: "n/a" if v != v else f"{v:.2f}"
+        f_cnr, h_cnr = m.get('fund_cnr', float('nan')), m.get('harm_cnr', float('nan'))
+        set_item(2, 0, fmt(f_cnr))
+        set_item(2, 1, fmt(h_cnr), QColor(165, 214, 167) if h_cnr > f_cnr else None)
         
         # 4. SNR (Higher is better)
-        f_snr, h_snr = m['fund_snr'], m['harm_snr']
-        set_item(3, 0, f"{f_snr:.2f}")
-        set_item(3, 1, f"{h_snr:.2f}", QColor(165, 214, 167) if h_snr > f_snr else None)
\ No newline at end of file
+        f_snr, h_snr = m.get('fund_snr', float('nan')), m.get('harm_snr', float('nan'))
+        set_item(3, 0, fmt(f_snr))
+        set_item(3, 1, fmt(h_snr), QColor(165, 214, 167) if h_snr > f_snr else None)
+        
+        # 5. Spatial compounding rows (only when compounded images were computed)
+        if 'fund_cnr_compound' in m:
+            self.table.setRowCount(6)
+            self.table.setVerticalHeaderLabels(self.row_labels + self.compound_labels)
+            for r, key in ((4, 'cnr'), (5, 'snr')): #higher is better
+                f_val, h_val = m[f'fund_{key}_compound'], m[f'harm_{key}_compound']
+                set_item(r, 0, f"{fmt(f_val)} (x{fmt(m[f'fund_{key}_gain'])})")
+                set_item(r, 1, f"{fmt(h_val)} (x{fmt(m[f'harm_{key}_gain'])})", QColor(165, 214, 167) if h_val > f_val else None)
+        else:
+            self.table.setRowCount(4)
+            self.table.setVerticalHeaderLabels(self.row_labels)
\ No newline at end of file
@@ -0,0 +1,139 @@
+import json
+import os
+import numpy as np
+
+# Inclusion types (also used as codes in the label lookup table)
+BACKGROUND = 0
+LAYER = 1
+CYST = 2
+WIRE = 3
+KIND_CODES = {'layer': LAYER, 'cyst': CYST, 'wire': WIRE}
+
+# Default phantom, same geometry as the original hard-coded one (units: mm)
+DEFAULT_PHANTOM = {
+    'inclusions': [
+        {'type': 'cyst', 'x_mm': 0.0, 'z_mm': 30.0, 'radius_mm': 6.0},    # Center Large
+        {'type': 'cyst', 'x_mm': -12.0, 'z_mm': 45.0, 'radius_mm': 4.0},  # Deep Left
+        {'type': 'cyst', 'x_mm': 12.0, 'z_mm': 15.0, 'radius_mm': 3.0},   # Shallow Right
+        {'type': 'wire', 'x_mm': 0.0, 'z_mm': 10.0},
+        {'type': 'wire', 'x_mm': 0.0, 'z_mm': 25.0},
+        {'type': 'wire', 'x_mm': 0.0, 'z_mm': 40.0},
+        {'type': 'wire', 'x_mm': 0.0, 'z_mm': 55.0},
+    ]
+}
+
+
+def nearest_index(axis, v): #same result as np.argmin(np.abs(axis - v)) but O(log N)
+    i = int(np.searchsorted(axis, v))
+    if i <= 0:
+        return 0
+    if i >= len(axis):
+        return len(axis) - 1
+    return i - 1 if abs(axis[i-1] - v) <= abs(axis[i] - v) else i
+
+
+class PhantomDefinition: #list of inclusions (layers, cysts, wires) loaded from dict / JSON / YAML
+    def __init__(self, config=None):
+        config = DEFAULT_PHANTOM if config is None else config
+        self.inclusions = [self._parse(i, inc) for i, inc in enumerate(config.get('inclusions', []))]
+
+    @classmethod
+    def from_file(cls, path):
+        ext = os.path.splitext(path)[1].lower()
+        with open(path, 'r') as f:
+            if ext in ('.yaml', '.yml'):
+                try:
+                    import yaml
+                except ImportError:
+                    raise ImportError("PyYAML is required to load YAML phantoms (pip install pyyaml)")
+                config = yaml.safe_load(f)
+            else:
+                config = json.load(f)
+        return cls(config)
+
+    @staticmethod
+    def _parse(i, inc): #convert one file entry (mm) into meters
+        kind = inc.get('type')
+        if kind not in KIND_CODES:
+            raise ValueError(f"Inclusion {i}: unknown type {kind!r}")
+        try:
+            if kind == 'layer':
+                return {'type': kind,
+                        'z_top': inc['z_top_mm'] * 1e-3,
+                        'z_bottom': inc['z_bottom_mm'] * 1e-3,
+                        'echo': float(inc.get('echogenicity', 1.0))}
+            if kind == 'cyst':
+                return {'type': kind,
+                        'x': inc['x_mm'] * 1e-3,
+                        'z': inc['z_mm'] * 1e-3,
+                        'r': inc['radius_mm'] * 1e-3,
+                        'echo': float(inc.get('echogenicity', 0.0))} #anechoic by default
+            return {'type': kind,
+                    'x': inc['x_mm'] * 1e-3,
+                    'z': inc['z_mm'] * 1e-3,
+                    'intensity': float(inc.get('intensity', 50.0)), #much brighter than bg
+                    'size_px': int(inc.get('size_px', 2))}
+        except KeyError as e:
+            raise ValueError(f"Inclusion {i} ({kind}): missing field {e.args[0]!r}")
+
+    def to_config(self): #back to the file format (mm), e.g. for saving / snapshots
+        out = []
+        for inc in self.inclusions:
+            if inc['type'] == 'layer':
+                out.append({'type': 'layer', 'z_top_mm': inc['z_top'] * 1e3, 'z_bottom_mm': inc['z_bottom'] * 1e3,
+                            'echogenicity': inc['echo']})
+            elif inc['type'] == 'cyst':
+                out.append({'type': 'cyst', 'x_mm': inc['x'] * 1e3, 'z_mm': inc['z'] * 1e3, 'radius_mm': inc['r'] * 1e3,
+                            'echogenicity': inc['echo']})
+            else:
+                out.append({'type': 'wire', 'x_mm': inc['x'] * 1e3, 'z_mm': inc['z'] * 1e3,
+                            'intensity': inc['intensity'], 'size_px': inc['size_px']})
+        return {'inclusions': out}
+
+    def rasterize(self, phantom, x, z):
+        # Writes inclusions into phantom (in place) touching only each bounding box.
+        # Returns (label_map, regions): label 0 = background, label k = inclusions[k-1]
+        n_z, n_x = phantom.shape
+        dtype = np.uint16 if len(self.inclusions) < np.iinfo(np.uint16).max else np.uint32
+        label_map = np.zeros((n_z, n_x), dtype=dtype)
+        regions = []
+
+        for label, inc in enumerate(self.inclusions, start=1):
+            kind = inc['type']
+            if kind == 'layer':
+                r0 = int(np.searchsorted(z, inc['z_top'], 'left'))
+                r1 = int(np.searchsorted(z, inc['z_bottom'], 'right'))
+                c0, c1 = 0, n_x
+                phantom[r0:r1, :] *= inc['echo']
+                label_map[r0:r1, :] = label
+            elif kind == 'cyst':
+                cx, cz, r = inc['x'], inc['z'], inc['r']
+                r0 = int(np.searchsorted(z, cz - r, 'left'))
+                r1 = int(np.searchsorted(z, cz + r, 'right'))
+                c0 = int(np.searchsorted(x, cx - r, 'left'))
+                c1 = int(np.searchsorted(x, cx + r, 'right'))
+                mask = (x[None, c0:c1] - cx)**2 + (z[r0:r1, None] - cz)**2 < r**2 #circle eq. inside bbox only
+                phantom[r0:r1, c0:c1][mask] *= inc['echo']
+                label_map[r0:r1, c0:c1][mask] = label
+            elif not (z[0] <= inc['z'] <= z[-1] and x[0] <= inc['x'] <= x[-1]): #outside the field of view
+                r0 = r1 = c0 = c1 = 0 #empty region instead of clamping onto the border pixel
+            else:
+                r0 = nearest_index(z, inc['z'])
+                c0 = nearest_index(x, inc['x'])
+                r1 = min(r0 + inc['size_px'], n_z)
+                c1 = min(c0 + inc['size_px'], n_x)
+                phantom[r0:r1, c0:c1] = inc['intensity']
+                label_map[r0:r1, c0:c1] = label
+            regions.append((r0, r1, c0, c1))
+
+        return label_map, regions
+
+    def cyst_mask(self, label_map, x, z, regions): #footprint of all cysts: label map + geometry where later inclusions overwrote
+        mask = self.kind_lut()[label_map] == CYST
+        for label, (inc, (r0, r1, c0, c1)) in enumerate(zip(self.inclusions, regions), start=1):
+            if inc['type'] == 'cyst' and np.any(label_map[r0:r1, c0:c1] > label): #relabelled pixels (bbox only)
+                mask[r0:r1, c0:c1] |= (x[None, c0:c1] - inc['x'])**2 + (z[r0:r1, None] - inc['z'])**2 < inc['r']**2
+        return mask
+
+    def kind_lut(self): #label -> kind code, so kind_lut()[label_map] gives a kind map
+        return np.array([BACKGROUND] + [KIND_CODES[inc['type']] for inc in self.inclusions], dtype=np.uint8)
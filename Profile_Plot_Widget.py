@@ -1,7 +1,17 @@
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 from PyQt5.QtWidgets import *
+import numpy as np
 
+from Phantom_Definition import nearest_index
+
+# Colorbar label per atlas summary map (profiles are normalized -> intensities are unitless)
+MAP_UNITS = {
+    'crossover_depth': 'cm',
+    'peak_harm_depth': 'cm',
+    'peak_harm': 'rel. intensity',
+    'harm_gain': 'rel. intensity',
+}
 
 class ProfilePlotWidget(QWidget):
     def __init__(self, parent=None):
@@ -14,17 +24,65 @@ class ProfilePlotWidget(QWidget):
         self.figure = Figure(figsize=(5, 4.5), facecolor='white')
         self.canvas = FigureCanvas(self.figure)
         self.ax = self.figure.add_subplot(111)
+        self.atlas = None #precomputed profiles for the slider grid (see set_atlas)
+        self.map_ax = None
+        self.marker = None
+        self.lines = None #(fundamental, harmonic) Line2D, updated in place while the depth axis stays the same
         layout.addWidget(self.canvas)
         self.setLayout(layout)
 
+    def set_atlas(self, atlas, map_key='crossover_depth'): #atlas from get_profile_atlas -> summary map under the profiles
+        self.atlas = atlas
+        if self.map_ax is None:
+            gs = self.figure.add_gridspec(3, 1)
+            self.ax.set_subplotspec(gs[:2])
+            self.map_ax = self.figure.add_subplot(gs[2])
+        self.map_ax.clear()
+        f_MHz = atlas['freqs'] / 1e6
+        nls = atlas['nls']
+        img = self.map_ax.imshow(atlas[map_key].T, origin='lower', aspect='auto', cmap='viridis',
+                                 extent=[f_MHz[0], f_MHz[-1], nls[0], nls[-1]])
+        self.figure.colorbar(img, ax=self.map_ax, label=MAP_UNITS.get(map_key, ''))
+        self.map_ax.set_title(map_key.replace('_', ' ').capitalize(), fontsize=10, fontweight='600', color='#2c3e50')
+        self.map_ax.set_xlabel('Frequency [MHz]', fontsize=9, color='#2c3e50')
+        self.map_ax.set_ylabel('NL coeff', fontsize=9, color='#2c3e50')
+        self.map_ax.tick_params(colors='#34495e', labelsize=8)
+        self.marker, = self.map_ax.plot([], [], marker='o', color='#e74c3c', markeredgecolor='white', markersize=8)
+
+    def lookup(self, freq_hz, nonlinear_coeff): #-> (z, fund, harm) from the atlas, None if off the grid
+        if self.atlas is None:
+            return None
+        freqs, nls = self.atlas['freqs'], self.atlas['nls']
+        i, j = nearest_index(freqs, freq_hz), nearest_index(nls, nonlinear_coeff)
+        if not (np.isclose(freqs[i], freq_hz) and np.isclose(nls[j], nonlinear_coeff)):
+            return None
+        return self.atlas['z'], self.atlas['fund'][i, j], self.atlas['harm'][i, j]
+
+    def show_profile(self, freq_hz, nonlinear_coeff): #table lookup instead of recomputing; None if off the grid
+        profile = self.lookup(freq_hz, nonlinear_coeff)
+        if profile is None:
+            return None
+        self.marker.set_data([freq_hz / 1e6], [nonlinear_coeff])
+        self.plot_profiles(*profile)
+        return profile
+
     def plot_profiles(self, depth, fund, harm):
+        if self.lines is not None and np.array_equal(self.lines[0].get_xdata(), depth): #slider tick: data only, no re-layout
+            self.lines[0].set_ydata(fund)
+            self.lines[1].set_ydata(harm)
+            self.ax.relim()
+            self.ax.autoscale_view()
+            self.canvas.draw()
+            return
+        
         self.ax.clear()
         
         self.ax.set_facecolor('#f8f9fa')
         self.figure.patch.set_facecolor('#ffffff')
         
-        self.ax.plot(depth, fund, color='#3498db', linewidth=2.5, label='Fundamental', alpha=0.9)
-        self.ax.plot(depth, harm, color='#e74c3c', linewidth=2.5, label='Harmonics', alpha=0.9)
+        fund_line, = self.ax.plot(depth, fund, color='#3498db', linewidth=2.5, label='Fundamental', alpha=0.9)
+        harm_line, = self.ax.plot(depth, harm, color='#e74c3c', linewidth=2.5, label='Harmonics', alpha=0.9)
+        self.lines = (fund_line, harm_line)
         
         self.ax.axvline(3, color='#7f8c8d', linestyle='--', linewidth=1.5, alpha=0.7)
         
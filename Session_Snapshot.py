@@ -0,0 +1,73 @@
+import io
+import json
+import mmap
+import struct
+import numpy as np
+
+# Snapshot file: MAGIC | uint64 header length | JSON header | arrays (raw, C order, 64-byte aligned).
+# The header holds parameters, metrics and {name: dtype/shape/offset}; loading maps the file once
+# and wraps each array around the mapping (zero-copy, read-only).
+# Compressed snapshots are a zip (np.savez_compressed) with the same JSON header as '__header__'.
+MAGIC = b'USSNAP\x00\x01'
+ALIGN = 64
+LEN = struct.Struct('<Q')
+
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def save_snapshot(path, arrays, params=None, metrics=None, compressed=False):
+    arrays = {k: np.ascontiguousarray(v) for k, v in arrays.items() if v is not None}
+    header = {
+        'params': params or {},
+        'metrics': {k: float(v) for k, v in (metrics or {}).items()},
+        'arrays': {},
+    }
+
+    if compressed: #archiving: smaller, but loading decompresses into memory
+        header['arrays'] = {k: {'dtype': v.dtype.str, 'shape': list(v.shape)} for k, v in arrays.items()}
+        raw = np.frombuffer(json.dumps(header).encode('utf-8'), dtype=np.uint8)
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, __header__=raw, **arrays)
+        return
+
+    offset = 0 #relative to the (aligned) start of the data section
+    for k, v in arrays.items():
+        header['arrays'][k] = {'dtype': v.dtype.str, 'shape': list(v.shape), 'offset': offset}
+        offset = _align(offset + v.nbytes)
+    raw = json.dumps(header).encode('utf-8')
+    data_start = _align(len(MAGIC) + LEN.size + len(raw))
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(LEN.pack(len(raw)))
+        f.write(raw)
+        for k, v in arrays.items():
+            f.seek(data_start + header['arrays'][k]['offset'])
+            f.write(memoryview(v).cast('B'))
+        f.truncate(data_start + offset)
+
+
+def load_snapshot(path): #-> {'params', 'metrics', 'arrays'}; arrays are read-only views of the mapped file
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+        if magic[:2] == b'PK': #zip -> compressed snapshot
+            f.seek(0)
+            with np.load(io.BytesIO(f.read())) as npz:
+                header = json.loads(npz['__header__'].tobytes())
+                arrays = {k: npz[k] for k in header['arrays']}
+            return {'params': header['params'], 'metrics': header['metrics'], 'arrays': arrays}
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a simulator snapshot")
+        header_len = LEN.unpack(f.read(LEN.size))[0]
+        header = json.loads(f.read(header_len))
+        data_start = _align(len(MAGIC) + LEN.size + header_len)
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) #stays valid after the file is closed
+
+    arrays = {}
+    for k, info in header['arrays'].items():
+        dtype = np.dtype(info['dtype'])
+        count = int(np.prod(info['shape']))
+        arrays[k] = np.frombuffer(buf, dtype=dtype, count=count, offset=data_start + info['offset']).reshape(info['shape'])
+    return {'params': header['params'], 'metrics': header['metrics'], 'arrays': arrays}
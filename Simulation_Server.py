@@ -0,0 +1,200 @@
+import sys
+import json
+import socket
+import struct
+import asyncio
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from Ultrasound_Simulator import UltrasoundSimulator
+from Compute_Backends import available_backends
+
+# Wire format (both directions): 4-byte big-endian header length + JSON header + binary payload.
+# Request header:  {"freq": Hz, "nl": coeff, "pi": bool, "metrics_only": bool (optional)}
+# Response header: {"ok": true, "shape": [n, n], "dtype": "float32", "metrics": {...}, "payload_bytes": k}
+#                  payload = fundamental image bytes followed by harmonic image bytes (none if metrics_only)
+HEADER_LEN = struct.Struct('>I')
+WIRE_DTYPE = np.float32 #dB images only need ~0.01 dB precision -> half the bytes of float64
+
+
+def encode_message(header, payload=b''):
+    header = dict(header, payload_bytes=len(payload))
+    raw = json.dumps(header).encode('utf-8')
+    return HEADER_LEN.pack(len(raw)) + raw + payload
+
+
+def request_key(freq, nl_coeff, pulse_inv, metrics_only=False): #slider values are quantized, so rounding makes identical requests match
+    return (round(float(freq), 1), round(float(nl_coeff), 6), bool(pulse_inv), bool(metrics_only))
+
+
+class SimulationServer: #asyncio service sharing one simulator, one cache and in-flight requests between clients
+    def __init__(self, simulator=None, cache_size=128):
+        self.simulator = simulator if simulator is not None else UltrasoundSimulator()
+        self.cache_size = cache_size
+        self._cache = OrderedDict() #key -> encoded response (LRU)
+        self._inflight = {} #key -> asyncio.Future of encoded response
+        self._executor = ThreadPoolExecutor(max_workers=1) #simulator is stateful -> one frame at a time
+        self.stats = {'requests': 0, 'cache_hits': 0, 'coalesced': 0, 'computed': 0}
+
+    async def get_frame(self, freq, nl_coeff, pulse_inv, metrics_only=False):
+        key = request_key(freq, nl_coeff, pulse_inv, metrics_only)
+        self.stats['requests'] += 1
+
+        if key in self._cache:
+            self.stats['cache_hits'] += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        if key in self._inflight: #identical request already running -> wait for the same result
+            self.stats['coalesced'] += 1
+        else: #own task: cancelling the request that started it doesn't strand the others
+            task = asyncio.get_running_loop().create_task(self._compute_cached(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        return await asyncio.shield(self._inflight[key])
+
+    def _finished(self, key, task):
+        del self._inflight[key]
+        if not task.cancelled():
+            task.exception() #mark retrieved even if every requester is gone
+
+    async def _compute_cached(self, key):
+        msg = await asyncio.get_running_loop().run_in_executor(self._executor, self._compute, *key)
+        self.stats['computed'] += 1
+        self._cache[key] = msg
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return msg
+
+    def _compute(self, freq, nl_coeff, pulse_inv, metrics_only): #runs in the worker thread
+        if metrics_only: #batch sweeps: no images formed or sent
+            stats = self.simulator.simulate_metrics(freq, nl_coeff, pulse_inv)
+            return encode_message({'ok': True, 'metrics': {k: float(v) for k, v in stats.items()}})
+        fund_img, harm_img, stats = self.simulator.simulate(freq, nl_coeff, pulse_inv)
+        payload = fund_img.astype(WIRE_DTYPE).tobytes() + harm_img.astype(WIRE_DTYPE).tobytes()
+        header = {
+            'ok': True,
+            'shape': list(fund_img.shape),
+            'dtype': np.dtype(WIRE_DTYPE).str,
+            'metrics': {k: float(v) for k, v in stats.items()},
+        }
+        return encode_message(header, payload)
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    raw_len = await reader.readexactly(HEADER_LEN.size)
+                except asyncio.IncompleteReadError: #client closed
+                    break
+                req = json.loads(await reader.readexactly(HEADER_LEN.unpack(raw_len)[0]))
+                try:
+                    msg = await self.get_frame(req['freq'], req['nl'], req['pi'], req.get('metrics_only', False))
+                except Exception as e:
+                    msg = encode_message({'ok': False, 'error': f"{type(e).__name__}: {e}"})
+                writer.write(msg)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, unix_path=None):
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle_client, path=unix_path)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+class SimulationClient: #blocking client with the same simulate()/get_profiles() interface as UltrasoundSimulator
+    def __init__(self, address='127.0.0.1:8765'):
+        self.address = address
+        self._sock = None
+        self._local = UltrasoundSimulator() #profiles are analytic & cheap -> computed locally
+
+    def _connect(self):
+        if self.address.startswith('unix:'):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.address[len('unix:'):])
+        else:
+            host, port = self.address.rsplit(':', 1)
+            sock = socket.create_connection((host, int(port)))
+        self._sock = sock
+
+    def _recv_exactly(self, n):
+        buf = bytearray(n)
+        view = memoryview(buf)
+        got = 0
+        while got < n:
+            k = self._sock.recv_into(view[got:])
+            if k == 0:
+                raise ConnectionError("Simulation server closed the connection")
+            got += k
+        return buf
+
+    def _request(self, header):
+        if self._sock is None:
+            self._connect()
+        try:
+            self._sock.sendall(encode_message(header))
+            resp_len = HEADER_LEN.unpack(self._recv_exactly(HEADER_LEN.size))[0]
+            resp = json.loads(bytes(self._recv_exactly(resp_len)))
+            payload = self._recv_exactly(resp['payload_bytes'])
+        except OSError:
+            self.close() #reconnect on next call
+            raise
+        if not resp['ok']:
+            raise RuntimeError(resp['error'])
+        return resp, payload
+
+    def simulate(self, freq, nl_coeff, pulse_inv):
+        resp, payload = self._request({'freq': freq, 'nl': nl_coeff, 'pi': bool(pulse_inv)})
+        shape = tuple(resp['shape'])
+        imgs = np.frombuffer(payload, dtype=np.dtype(resp['dtype'])).reshape((2,) + shape) #zero-copy view
+        return imgs[0], imgs[1], resp['metrics']
+
+    def simulate_metrics(self, freq, nl_coeff, pulse_inv):
+        resp, _ = self._request({'freq': freq, 'nl': nl_coeff, 'pi': bool(pulse_inv), 'metrics_only': True})
+        return resp['metrics']
+
+    def get_profiles(self, freq_hz, nonlinear_coeff):
+        return self._local.get_profiles(freq_hz, nonlinear_coeff)
+
+    def get_profile_atlas(self, freqs_hz, nonlinear_coeffs):
+        return self._local.get_profile_atlas(freqs_hz, nonlinear_coeffs)
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local US simulation server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help="serve on a Unix socket path instead of TCP")
+    parser.add_argument('--grid', type=int, default=256)
+    parser.add_argument('--phantom', help="JSON/YAML phantom definition")
+    parser.add_argument('--cache', type=int, default=128, help="number of frames kept in the result cache")
+    parser.add_argument('--backend', default='auto', choices=['auto'] + available_backends(),
+                        help="compute backend (auto = fastest verified backend for the grid size)")
+    args = parser.parse_args()
+
+    simulator = UltrasoundSimulator(grid_size=args.grid, backend=args.backend)
+    if args.phantom:
+        simulator.load_phantom(args.phantom)
+    server = SimulationServer(simulator, cache_size=args.cache)
+    where = args.unix if args.unix else f"{args.host}:{args.port}"
+    print(f"Simulation server listening on {where}", file=sys.stderr)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,50 @@
+import time
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from scipy.signal import convolve2d
+from scipy.ndimage import correlate1d
+
+from Compute_Backends import DEFAULT_BACKEND, ComputeBackend, SpectralConvolver, get_backend, select_backend
+from Phantom_Definition import PhantomDefinition
+
+SPECTRA_CACHE_BYTES = 256 * 2**20 #kernel spectra kept for repeated frames / compound angles
+
+def outer_index(rows, cols): #img[outer_index(rows, cols)] -> outer product also for two index arrays
+    if isinstance(rows, np.ndarray) and isinstance(cols, np.ndarray):
+        return np.ix_(rows, cols)
+    return rows, cols
+
+
+def depth_profiles(f_MHz, nonlinear_coeff, z): #fundamental & harmonic curves, broadcasts over f_MHz / nl / z
+    alpha = 0.5  # Attenuation coeff
+
+    #Fundamental
+    fund = np.exp(-(2 * alpha * f_MHz * z) / 8.686) #exponential attenuation with depth
+    fund = fund / np.max(fund, axis=-1, keepdims=True) # normalize to 1
+
+    #Harmonic
+    # 1. Growth: according to: nl_coeff, freq, z 
+    beta_effect = nonlinear_coeff * 2.0 
+    growth = beta_effect * (f_MHz * 0.5) * z
+    # 2. Decay: higher freq, faster attenuation
+    decay = np.exp(-(2 * alpha * (2 * f_MHz) * z) / 8.686)
+    harm = growth * decay
+    harm_scale_factor = 0.6 + (nonlinear_coeff * 0.8)
+
+    # Normalize shape then apply scale (curves that never grow stay at 0)
+    harm_max = np.max(harm, axis=-1, keepdims=True)
+    harm = np.divide(harm, harm_max, out=np.zeros_like(harm), where=harm_max > 0) * harm_scale_factor
+    return fund, harm
+
+
+def convolve_same_1d(src, h, axis, out): #1D 'same' convolution along axis (zero padded), written into out
+    # correlate with the flipped kernel; even lengths need the origin nudged to match np.convolve's centring
+    correlate1d(src, h[::-1], axis=axis, output=out, mode='constant', origin=-((len(h) + 1) % 2))
+    return out
 
 class UltrasoundSimulator: #core simulation engine
-    def __init__(self, grid_size=256):
+    def __init__(self, grid_size=256, phantom_def=None, buffer_pool=False, profile_memory=False, backend=DEFAULT_BACKEND):
         self.grid_size = grid_size #4*6cm
         self.width_m = 40e-3
         self.depth_m = 60e-3
@@ -14,8 +56,34 @@ class UltrasoundSimulator: #core simulation engine
         self.fundamental_img = None #stores last simulated img
         self.harmonic_img = None #stores last simulated img
         self.phantom = None
-        self.cyst_masks = []
-        self.inner_cyst_masks = []
+        self.phantom_def = phantom_def if phantom_def is not None else PhantomDefinition()
+        self.label_map = None #0 = background, k = phantom_def.inclusions[k-1]
+        self.regions = [] #(r0, r1, c0, c1) bounding box per inclusion
+        self.cyst_map = None #all cyst footprints from the label map (excluded from the background ROI)
+        
+        # Compute backend for convolution / PSF / metric reductions ('auto' = benchmarked once per grid size, opt-in)
+        if isinstance(backend, ComputeBackend):
+            self.backend = backend
+        elif backend == 'auto':
+            self.backend = select_backend(grid_size)
+        else:
+            self.backend = get_backend(backend)
+        
+        # Buffer-pool mode: per-shape working buffers reused by every frame (see _run_imaging_pooled)
+        self.buffer_pool = buffer_pool
+        self.profile_memory = profile_memory #trace peak allocation per frame (tracemalloc)
+        self._pool = {}
+        self._psf_cache = {}
+        self.frame_stats = {'peak_bytes': None, 'pool_bytes': 0}
+        self.scan_stats = {} #mode -> time to first block / full frame of the last scan
+        self._padded = None #(phantom, pads, zero-padded phantom)
+        self._padded_t = None #(zero-padded phantom, its transpose)
+        self._spectra_cache = {} #kernel-set key -> kernel spectra
+        self._spectra_lock = threading.Lock()
+        self.pi_motion_m = 0.0 #axial tissue motion between the two pulse-inversion transmits
+        self._spectral = None #(phantom, SpectralConvolver)
+        self.compound_imgs = {} #mode -> compounded dB image of the current phantom
+        self._atlas_cache = {} #(freqs, nls) -> profile atlas
         
         # Target depth for resolution measurement
         self.wire_depth_m = 25e-3 
@@ -23,75 +91,183 @@ class UltrasoundSimulator: #core simulation engine
     def create_phantom(self):
         np.random.seed(42) #reproducability
         
+        self.compound_imgs = {}
+        
         # 1. Background Tissue (normal distribution simulating US speckles)
         self.phantom = np.abs(np.random.normal(0, 1.0, (self.grid_size, self.grid_size)))
         
-        # 2. Cysts (Perfectly Empty / Anechoic) #(x_center, z_center, radius) in meters
-        configs = [
-            (0, 30e-3, 6e-3),       # Center Large
-            (-12e-3, 45e-3, 4e-3),  # Deep Left
-            (12e-3, 15e-3, 3e-3)    # Shallow Right
-        ]
-        
-        self.cyst_masks = []
-        self.inner_cyst_masks = []
-        
-        for cx, cz, r in configs:
-            mask = (self.X - cx)**2 + (self.Z - cz)**2 < r**2  #circle eq.
-            self.phantom[mask] = 0.0  #set regions to 0 "Black"
-            self.cyst_masks.append(mask)
-            inner = (self.X - cx)**2 + (self.Z - cz)**2 < (r * 0.5)**2 #inner 50% rad circles
-            self.inner_cyst_masks.append(inner)
-
-        # 3. Wire Targets
-        wire_depths = [10e-3, self.wire_depth_m, 40e-3, 55e-3] #10,25,40,55mm, laterally centered
-        for d in wire_depths:
-            z_idx = np.argmin(np.abs(self.z - d))
-            x_idx = np.argmin(np.abs(self.x - 0))
-            self.phantom[z_idx:z_idx+2, x_idx:x_idx+2] = 50.0 #50 inetnsity " much brighter than bg"
+        # 2. Layers, cysts & wires from the phantom definition (bounding-box rasterization)
+        self.label_map, self.regions = self.phantom_def.rasterize(self.phantom, self.x, self.z)
+        self.cyst_map = self.phantom_def.cyst_mask(self.label_map, self.x, self.z, self.regions)
             
         return self.phantom
 
-    def get_psf(self, mode, freq_hz, nonlinear_coeff): #Point Spread Function (simulates ultrasound beam shape)
+    def load_phantom(self, path): #JSON / YAML phantom file
+        self.phantom_def = PhantomDefinition.from_file(path)
+        return self.create_phantom()
+
+    def inclusion_mask(self, index, scale=1.0): #circle mask of a cyst inside its bbox -> (bbox, mask)
+        inc = self.phantom_def.inclusions[index]
+        r0, r1, c0, c1 = self.regions[index]
+        mask = (self.X[r0:r1, c0:c1] - inc['x'])**2 + (self.Z[r0:r1, c0:c1] - inc['z'])**2 < (inc['r'] * scale)**2
+        return (r0, r1, c0, c1), mask #scaled ROI -> geometry (overlapping inclusions don't shrink it)
+
+    def get_psf_factors(self, mode, freq_hz, nonlinear_coeff, axial_shift_px=0.0): #separable PSF: psf = outer(pulse, beam)
         k_size = 41  #kernel size: odd, medium (lobes + computations)
         xk = np.linspace(-6, 6, k_size) #spread more laterally
         zk = np.linspace(-3, 3, k_size) #than axially like real US
-        Xk, Zk = np.meshgrid(xk, zk)
-        r = np.sqrt(Xk**2) #vary mainly in lateral direction
+        r = np.sqrt(xk**2) #vary mainly in lateral direction
         freq_scale = (3.5e6 / freq_hz) #good for depth
 
         if mode == 'fundamental':
             # Standard Beam
             width = 0.85 * freq_scale 
             sl_amp = 0.20 #side lobe
-            beam = np.sinc(r / width) + sl_amp * np.exp(-(r - 3)**2) * np.cos(2*np.pi*r) #main beam + side lobes
+            beam = self.backend.psf_beam(r, width, sl_amp) #main beam + side lobes
         else: #for harmonic:
             width = 0.85 * freq_scale 
             sl_amp = 0.20 
-            base = np.sinc(r / width) + sl_amp * np.exp(-(r - 3)**2) * np.cos(2*np.pi*r)
 
             # power factor is of [2.0-2.4] range    
             power_factor = 2.0 + (nonlinear_coeff * 0.5) #square of harmonic + non-linearity factor
-            beam = np.sign(base) * (np.abs(base) ** power_factor)
+            beam = self.backend.psf_beam(r, width, sl_amp, power_factor)
 
-        # Normalize Lateral beam energy
-        beam /= (np.sum(np.abs(beam)) + 1e-9)
+        # Normalize Lateral beam energy (over the whole 2D kernel = k_size identical rows)
+        beam /= (k_size * np.sum(np.abs(beam)) + 1e-9)
         
-        # Axial pulse
+        # Axial pulse (optionally displaced by axial_shift_px rows, e.g. tissue motion between transmits)
+        zk = zk - axial_shift_px * (6.0 / (k_size - 1))
+        pulse = np.exp(-zk**2 / (0.8 * freq_scale)) * np.cos(2*np.pi*zk)
+        return pulse, beam
+
+    def get_psf(self, mode, freq_hz, nonlinear_coeff, angle_deg=0.0, axial_shift_px=0.0): #Point Spread Function (simulates ultrasound beam shape)
+        if angle_deg == 0.0:
+            pulse, beam = self.get_psf_factors(mode, freq_hz, nonlinear_coeff, axial_shift_px)
+            return np.outer(pulse, beam) #creates 2D psf then muoltiply them
+
+        # Steered beam: rotate kernel pixel offsets in physical units (pixels are not square),
+        # then evaluate the same lateral beam / axial pulse along the rotated axes
+        k_size = 41
+        dx = self.width_m / (self.grid_size - 1)
+        dz = self.depth_m / (self.grid_size - 1)
+        off = np.arange(k_size) - k_size // 2
+        Jk, Ik = np.meshgrid(off * dx, (off - axial_shift_px) * dz) #lateral, axial offsets in meters
+        th = np.deg2rad(angle_deg)
+        Xr = Jk * np.cos(th) - Ik * np.sin(th)
+        Zr = Jk * np.sin(th) + Ik * np.cos(th)
+        Xk = Xr / dx * (12.0 / (k_size - 1)) #back to kernel units (-6..6 laterally, -3..3 axially)
+        Zk = Zr / dz * (6.0 / (k_size - 1))
+        freq_scale = (3.5e6 / freq_hz)
+
+        width = 0.85 * freq_scale
+        sl_amp = 0.20
+        power_factor = None if mode == 'fundamental' else 2.0 + (nonlinear_coeff * 0.5)
+        beam = self.backend.psf_beam(np.abs(Xk), width, sl_amp, power_factor)
+        beam /= (np.sum(np.abs(beam)) + 1e-9)
         pulse = np.exp(-Zk**2 / (0.8 * freq_scale)) * np.cos(2*np.pi*Zk)
-        return beam * pulse #creates 2D psf then muoltiply them
+        return beam * pulse
 
     def run_imaging(self, mode, freq, nl_coeff, pulse_inv):
-        psf = self.get_psf(mode, freq, nl_coeff)
+        if self.profile_memory: #peak traced allocation during this frame
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+
+        if self.buffer_pool:
+            img_db = self._run_imaging_pooled(mode, freq, nl_coeff, pulse_inv)
+        else:
+            img_db = self._run_imaging_alloc(mode, freq, nl_coeff, pulse_inv)
+
+        if self.profile_memory:
+            self.frame_stats['peak_bytes'] = tracemalloc.get_traced_memory()[1] - base
+        self.frame_stats['pool_bytes'] = sum(b.nbytes for b in self._pool.values())
+        return img_db
+
+    def _run_imaging_alloc(self, mode, freq, nl_coeff, pulse_inv):
+        kernels = self._imaging_kernels(mode, freq, nl_coeff, pulse_inv)
+        key = (mode, freq, nl_coeff, pulse_inv, self.pi_motion_m)
+        envelope = self._envelope_window(mode, nl_coeff, pulse_inv, kernels, 0, self.phantom.shape[1], key)
+        img_db = self.log_compress(envelope)
+
+        if mode == "fundamental":
+            self.fundamental_img = img_db
+        else:
+            self.harmonic_img = img_db
+        return img_db
+
+    def _imaging_kernels(self, mode, freq, nl_coeff, pulse_inv, angle_deg=0.0): #PSFs needed by _form_envelope (in order)
+        kernels = {'psf': self.get_psf(mode, freq, nl_coeff, angle_deg)}
+        if mode == "harmonic":
+            fund_psf = self.get_psf("fundamental", freq, nl_coeff, angle_deg)
+            norm = np.sum(np.abs(fund_psf)) + 1e-9
+            if not pulse_inv:
+                kernels['leak'] = fund_psf / norm
+            else:
+                # Dual transmit: the 2nd (inverted) pulse sees tissue moved by pi_motion_m.
+                # Even-order (harmonic) echoes of both transmits add -> one summed kernel;
+                # fundamentals are kept apart because the odd-order term is nonlinear in them.
+                # Without motion both fundamentals cancel exactly -> no kernels for them at all.
+                shift_px = self.pi_motion_m / (self.depth_m / (self.grid_size - 1))
+                kernels['psf'] = kernels['psf'] + self.get_psf(mode, freq, nl_coeff, angle_deg, shift_px)
+                if shift_px:
+                    kernels['fund'] = fund_psf / norm
+                    kernels['fund_moved'] = self.get_psf("fundamental", freq, nl_coeff, angle_deg, shift_px) / norm
+        return kernels
+
+    def _window_fields(self, psfs, c0, c1, key=None): #(K, rows, c1-c0): phantom window convolved with each kernel
+        k_shape = psfs[0].shape
+        if c0 == 0 and c1 == self.phantom.shape[1]: #full frame (FFT backend: phantom spectrum shared by both modes)
+            return self._convolve_frame(np.stack(psfs), key)
+        # column block: window + PSF-sized halo, all kernels in one batched call
+        slab = self._padded_phantom(k_shape)[:, c0:c1 + k_shape[1] - 1]
+        if not self.backend.spectral:
+            return self.backend.convolve_many(slab, np.stack(psfs), mode='valid')
+        conv = SpectralConvolver(slab, k_shape) #FFT backend: equal-width blocks share the kernel spectra
+        return conv.convolve_spectra(self._kernel_spectra(conv, key, psfs), mode='valid')
+
+    def _convolve_frame(self, psfs, key=None): #(..., kh, kw) kernels -> (..., rows, cols) 'same' on the full phantom
+        if not self.backend.spectral:
+            return self.backend.convolve_many(self.phantom, psfs, mode='same')
+        conv = self._spectral_convolver(psfs.shape[-2:]) #FFT backend: cached phantom (and kernel) spectra
+        return conv.convolve_spectra(self._kernel_spectra(conv, key, psfs), mode='same')
+
+    def _kernel_spectra(self, conv, key, psfs): #recent kernel sets (slider frames / compound angles repeat)
+        if key is None:
+            return conv.kernel_spectra(np.stack(psfs))
+        key = tuple(key) + (conv.fshape,)
+        with self._spectra_lock: #scan-line workers share the cache
+            if key not in self._spectra_cache:
+                spectra = conv.kernel_spectra(np.stack(psfs))
+                while self._spectra_cache and sum(s.nbytes for s in self._spectra_cache.values()) + spectra.nbytes > SPECTRA_CACHE_BYTES:
+                    self._spectra_cache.pop(next(iter(self._spectra_cache))) #oldest first
+                self._spectra_cache[key] = spectra
+            return self._spectra_cache[key]
+
+    def _padded_phantom(self, k_shape): #phantom with a zero halo so 'valid' windows == 'same' on the full grid
+        pads = ((k_shape[0] // 2, (k_shape[0] - 1) // 2), (k_shape[1] // 2, (k_shape[1] - 1) // 2))
+        if self._padded is None or self._padded[0] is not self.phantom or self._padded[1] != pads:
+            self._padded = (self.phantom, pads, np.pad(self.phantom, pads))
+        return self._padded[2]
+
+    def _envelope_window(self, mode, nl_coeff, pulse_inv, kernels, c0, c1, key=None): #envelope of columns [c0, c1), all depths
+        # simulates beamforming by convolving phantom with the PSFs (columns + PSF-sized halo)
+        fields = self._window_fields(list(kernels.values()), c0, c1, key)
+        noise = self._buffer('noise', self.phantom.shape, self._noise_field)[:, c0:c1]
+        noise_inv = self._buffer('noise_inv', self.phantom.shape, self._noise_field_inv)[:, c0:c1] if pulse_inv else None
+        return self._form_envelope(mode, nl_coeff, pulse_inv, fields, noise, noise_inv)
+
+    def _form_envelope(self, mode, nl_coeff, pulse_inv, fields, noise, noise_inv=None, rows=slice(None)):
+        # fields: (..., K, rows, cols) convolutions with the kernels of _imaging_kernels, in order
+        # rows: which depths the fields cover (all by default)
         transmit_gain = 250.0
-        # simulates beamforming by convolving phantom with PSF
-        rf = convolve2d(self.phantom, psf, mode="same") * transmit_gain
+        rf = fields[..., 0, :, :] * transmit_gain
 
         # Nonlinear gain logi   c
         # Increasing nonlinear_coeff (beta) increases Harmonic signal strength
         if mode == "harmonic":
             # Growth with depth (z)
-            depth_gain = 1.0 + (nl_coeff * 2.0) * (self.Z / self.depth_m)
+            depth_gain = 1.0 + (nl_coeff * 2.0) * self._buffer('depth_ramp', (self.phantom.shape[0], 1), self._depth_ramp)[rows]
             # Overall brightness boost from coefficient
             amp_scale = 1.0 + (nl_coeff * 3.0) 
         else:
@@ -101,33 +277,169 @@ class UltrasoundSimulator: #core simulation engine
         rf *= depth_gain * amp_scale
 
         # Noise floor (Static seed for stability)
-        rng_state = np.random.RandomState(999)
-        noise_std = 0.6 
-        rf += rng_state.normal(0, noise_std, rf.shape)
+        rf += noise
+
+        # Pulse inversion: echoes of +p and -p are summed on receive. Harmonic (even-order) parts add,
+        # fundamental (linear) and odd-order parts cancel - except where tissue moved between transmits.
+        if mode == "harmonic" and pulse_inv:
+            rf += noise_inv #independent noise of the 2nd transmit -> signal x2, noise x sqrt2
+        if mode == "harmonic" and pulse_inv and fields.shape[-3] > 1: #fundamentals only exist with motion
+            s_pos = fields[..., 1, :, :] * transmit_gain #fundamental echo of +p
+            s_neg = fields[..., 2, :, :] * -transmit_gain #fundamental echo of -p (moved tissue)
+            lin_coeff, odd_coeff = self._pi_coeffs(nl_coeff)
+            odd = s_pos * s_pos * s_pos #3rd order, scaled so a unit reflector saturates
+            odd += s_neg * s_neg * s_neg
+            odd *= odd_coeff / transmit_gain**2
+            s_pos += s_neg #linear: cancels unless the tissue moved
+            s_pos *= lin_coeff
+            rf += s_pos
+            rf += odd
 
         envelope = np.abs(rf)  #removes oscilaation sign to keep magnitude only 
 
-        # Pulse inversion logic
-        if mode == "harmonic":
-            if pulse_inv:
-                # PI boosts signal (x2) vs noise (sqrt2) -> Net SNR gain
-                envelope *= 1.414 
-            else:
-                # Without PI, fundamental leaks in (clutter)
-                fund_psf = self.get_psf("fundamental", freq, nl_coeff)
-                fund_psf /= np.sum(np.abs(fund_psf)) + 1e-9
-                leakage = convolve2d(self.phantom, fund_psf, mode="same") * transmit_gain
-                
-                # Leakage is reduced if nonlinearity is high (better conversion)
-                leak_factor = 0.3 * (1.0 - (nl_coeff * 0.5))
-                envelope += leak_factor * np.abs(leakage)
-
-        # Log compression (conversion to dB)
-        # Fixed reference max prevents signal brightness jumping around arbitrarily
-        ref_max = np.max(envelope) if np.max(envelope) > 1e-9 else 1e-9
+        if mode == "harmonic" and not pulse_inv:
+            # Without PI, fundamental leaks in (clutter)
+            leakage = fields[..., 1, :, :] * transmit_gain
+            
+            # Leakage is reduced if nonlinearity is high (better conversion)
+            leak_factor = 0.3 * (1.0 - (nl_coeff * 0.5))
+            envelope += leak_factor * np.abs(leakage)
+        return envelope
+
+    def _pi_coeffs(self, nl_coeff): #linear receive leakage & odd-order response of the PI echoes
+        return 0.3 * (1.0 - (nl_coeff * 0.5)), 0.2 * nl_coeff
+
+    def log_compress(self, envelope, ref_max=None): # Log compression (conversion to dB)
+        if ref_max is None:
+            # Fixed reference max prevents signal brightness jumping around arbitrarily
+            ref_max = np.max(envelope)
+        ref_max = ref_max if ref_max > 1e-9 else 1e-9
         
         img_db = 20 * np.log10(envelope / ref_max + 1e-6) #normalize to brightest pixel
-        img_db = np.clip(img_db, -60, 0) #clip from -60 to 0 dB
+        return np.clip(img_db, -60, 0) #clip from -60 to 0 dB
+
+    def scan_lines(self, mode, freq, nl_coeff, pulse_inv, block_cols=16, workers=1):
+        # Scan-line mode: yields (c0, c1, envelope block) left to right like a real scanner.
+        # Once exhausted, the full frame is log-compressed & stored exactly as run_imaging would.
+        kernels = self._imaging_kernels(mode, freq, nl_coeff, pulse_inv)
+        self._padded_phantom(kernels['psf'].shape) #shared caches are built before workers start
+        self._buffer('noise', self.phantom.shape, self._noise_field)
+        self._buffer('noise_inv', self.phantom.shape, self._noise_field_inv)
+        self._buffer('depth_ramp', (self.phantom.shape[0], 1), self._depth_ramp)
+
+        n = self.phantom.shape[1]
+        blocks = [(c0, min(c0 + block_cols, n)) for c0 in range(0, n, block_cols)]
+        key = (mode, freq, nl_coeff, pulse_inv, self.pi_motion_m)
+        window = lambda b: self._envelope_window(mode, nl_coeff, pulse_inv, kernels, *b, key)
+        envelope = np.empty(self.phantom.shape)
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(window, blocks) if workers > 1 else map(window, blocks) #in order either way
+            for (c0, c1), env in zip(blocks, results):
+                envelope[:, c0:c1] = env
+                if c0 == 0:
+                    self.scan_stats[mode] = {'first_block_s': time.perf_counter() - t0}
+                yield c0, c1, env
+
+        img_db = self.log_compress(envelope)
+        self.scan_stats[mode]['frame_s'] = time.perf_counter() - t0
+        if mode == "fundamental":
+            self.fundamental_img = img_db
+        else:
+            self.harmonic_img = img_db
+
+    def scan_frame(self, freq, nl_coeff, pulse_inv, block_cols=16, workers=1):
+        # Both modes block by block: yields (c0, c1, fund envelope block, harm envelope block)
+        self.create_phantom()
+        fund = self.scan_lines('fundamental', freq, nl_coeff, pulse_inv, block_cols, workers)
+        harm = self.scan_lines('harmonic', freq, nl_coeff, pulse_inv, block_cols, workers)
+        for (c0, c1, f_env), (_, _, h_env) in zip(fund, harm):
+            yield c0, c1, f_env, h_env
+        for _ in harm: #finish the harmonic generator so its frame gets stored
+            pass
+
+    def _buffer(self, name, shape, init=None): #per-shape working buffer owned by the simulator
+        key = (name, shape)
+        buf = self._pool.get(key)
+        if buf is None:
+            buf = np.empty(shape) if init is None else init(shape)
+            self._pool[key] = buf
+        return buf
+
+    def _run_imaging_pooled(self, mode, freq, nl_coeff, pulse_inv):
+        # Same pipeline as _run_imaging_alloc, but every step writes into pooled buffers (out=)
+        # so steady-state frames allocate no frame-sized arrays. The returned image is a
+        # pooled buffer too: it is overwritten by the next frame of the same mode.
+        shape = self.phantom.shape
+        transmit_gain = 250.0
+        rf = self._buffer('rf', shape)
+        lat = self._buffer('lat', shape)
+
+        # separable PSF -> lateral pass then axial pass (gain folded into the kernel)
+        pulse, beam = self._psf_factors_cached(mode, freq, nl_coeff)
+        shift_px = self.pi_motion_m / (self.depth_m / (self.grid_size - 1))
+        if mode == "harmonic" and pulse_inv: #harmonic echoes of both transmits: same beam, summed pulses
+            pulse = pulse + self._psf_factors_cached(mode, freq, nl_coeff, shift_px)[0]
+        convolve_same_1d(self.phantom, beam * transmit_gain, 1, lat)
+        convolve_same_1d(lat, pulse, 0, rf)
+
+        if mode == "harmonic":
+            # depth gain only varies with z -> (N, 1) column instead of a full grid
+            depth_gain = self._buffer('depth_gain', (shape[0], 1))
+            np.multiply(self._buffer('depth_ramp', (shape[0], 1), self._depth_ramp), nl_coeff * 2.0, out=depth_gain)
+            depth_gain += 1.0
+            depth_gain *= 1.0 + (nl_coeff * 3.0)
+            rf *= depth_gain
+
+        rf += self._buffer('noise', shape, self._noise_field) #static seed -> generated once per shape
+
+        if mode == "harmonic" and pulse_inv: #dual transmit, see _form_envelope
+            rf += self._buffer('noise_inv', shape, self._noise_field_inv)
+        if mode == "harmonic" and pulse_inv and shift_px: #fundamentals cancel exactly without motion
+            pulse, beam = self._psf_factors_cached("fundamental", freq, nl_coeff)
+            pulse_moved = self._psf_factors_cached("fundamental", freq, nl_coeff, shift_px)[0]
+            norm = np.sum(np.abs(pulse)) * np.sum(np.abs(beam)) + 1e-9
+            lin_coeff, odd_coeff = self._pi_coeffs(nl_coeff)
+            s_pos = self._buffer('leak', shape)
+            s_neg = self._buffer('s_neg', shape)
+            tmp = self._buffer('tmp', shape)
+            convolve_same_1d(self.phantom, beam * (transmit_gain / norm), 1, lat) #lateral pass shared by both
+            convolve_same_1d(lat, pulse, 0, s_pos)
+            convolve_same_1d(lat, -pulse_moved, 0, s_neg)
+            np.multiply(s_pos, s_pos, out=tmp) #odd (3rd) order: s_pos^3 + s_neg^3
+            tmp *= s_pos
+            np.multiply(s_neg, s_neg, out=lat)
+            lat *= s_neg
+            tmp += lat
+            tmp *= odd_coeff / transmit_gain**2
+            s_pos += s_neg #linear: cancels unless the tissue moved
+            s_pos *= lin_coeff
+            rf += s_pos
+            rf += tmp
+
+        envelope = np.abs(rf, out=rf)
+
+        if mode == "harmonic" and not pulse_inv:
+            pulse, beam = self._psf_factors_cached("fundamental", freq, nl_coeff)
+            norm = np.sum(np.abs(pulse)) * np.sum(np.abs(beam)) + 1e-9 #= sum |outer(pulse, beam)|
+            leak_factor = 0.3 * (1.0 - (nl_coeff * 0.5))
+            leakage = self._buffer('leak', shape)
+            convolve_same_1d(self.phantom, beam * (transmit_gain / norm), 1, lat)
+            convolve_same_1d(lat, pulse, 0, leakage)
+            np.abs(leakage, out=leakage)
+            leakage *= leak_factor
+            envelope += leakage
+
+        ref_max = envelope.max()
+        ref_max = ref_max if ref_max > 1e-9 else 1e-9
+
+        img_db = self._buffer(mode, shape)
+        np.divide(envelope, ref_max, out=img_db)
+        img_db += 1e-6
+        np.log10(img_db, out=img_db)
+        img_db *= 20
+        np.clip(img_db, -60.0, 0.0, out=img_db)
 
         if mode == "fundamental":
             self.fundamental_img = img_db
@@ -135,89 +447,282 @@ class UltrasoundSimulator: #core simulation engine
             self.harmonic_img = img_db
         return img_db
 
+    def _psf_factors_cached(self, mode, freq, nl_coeff, axial_shift_px=0.0):
+        key = (mode, freq, nl_coeff if mode == 'harmonic' else None, axial_shift_px)
+        if key not in self._psf_cache:
+            self._psf_cache[key] = self.get_psf_factors(mode, freq, nl_coeff, axial_shift_px)
+        return self._psf_cache[key]
+
+    def _depth_ramp(self, shape): #z / depth as a column
+        return (self.z / self.depth_m).reshape(shape)
+
+    def _noise_field(self, shape): # Noise floor (Static seed for stability)
+        return np.random.RandomState(999).normal(0, 0.6, shape)
+
+    def _noise_field_inv(self, shape): #noise of the inverted PI transmit
+        return np.random.RandomState(1000).normal(0, 0.6, shape)
+
+    def _spectral_convolver(self, k_shape): #phantom spectrum, shared by all kernels of a batch / frame
+        if self._spectral is None or self._spectral[0] is not self.phantom or self._spectral[1].k_shape != tuple(k_shape):
+            self._spectral = (self.phantom, SpectralConvolver(self.phantom, k_shape))
+        return self._spectral[1]
+
+    def run_compound(self, mode, freq, nl_coeff, pulse_inv, angles_deg=(-10.0, 0.0, 10.0)):
+        # Spatial compounding: one steered PSF set per angle, envelopes averaged before log compression.
+        # FFT backend: the phantom spectrum is shared and kernel spectra are cached per angle, but
+        # envelope detection is nonlinear, so every angle still needs its own inverse FFTs (cost stays
+        # roughly linear in the number of angles). Angles are enveloped one at a time into a single
+        # accumulator instead of an (angles, K, rows, cols) stack.
+        shape = (len(angles_deg),) + self.phantom.shape
+        noise = self._buffer('compound_noise', shape, self._compound_noise) #independent noise per angle
+        noise_inv = self._buffer('compound_noise_inv', shape, self._compound_noise_inv) if pulse_inv else None
+        envelope = np.zeros(self.phantom.shape)
+        for i, angle in enumerate(angles_deg):
+            kernels = self._imaging_kernels(mode, freq, nl_coeff, pulse_inv, angle)
+            key = (mode, freq, nl_coeff, pulse_inv, self.pi_motion_m) + ((angle,) if angle else ())
+            fields = self._convolve_frame(np.stack(list(kernels.values())), key)
+            envelope += self._form_envelope(mode, nl_coeff, pulse_inv, fields, noise[i],
+                                            noise_inv[i] if pulse_inv else None)
+
+        img_db = self.log_compress(envelope / len(angles_deg))
+        self.compound_imgs[mode] = img_db
+        return img_db
+
+    def _compound_noise(self, shape): #(angles, z, x): angle i uses seed 999 + 2i (+1 for the inverted PI transmit)
+        return np.stack([np.random.RandomState(999 + 2*i).normal(0, 0.6, shape[1:]) for i in range(shape[0])])
+
+    def _compound_noise_inv(self, shape):
+        return np.stack([np.random.RandomState(1000 + 2*i).normal(0, 0.6, shape[1:]) for i in range(shape[0])])
+
+    def simulate(self, freq, nl_coeff, pulse_inv, compound_angles=None): #phantom + both images + metrics in one call
+        self.create_phantom()
+        fund_img = self.run_imaging('fundamental', freq, nl_coeff, pulse_inv)
+        harm_img = self.run_imaging('harmonic', freq, nl_coeff, pulse_inv)
+        if compound_angles: #compound images are returned for display, metrics report both
+            fund_img = self.run_compound('fundamental', freq, nl_coeff, pulse_inv, compound_angles)
+            harm_img = self.run_compound('harmonic', freq, nl_coeff, pulse_inv, compound_angles)
+        return fund_img, harm_img, self.get_metrics()
+
+    def simulate_metrics(self, freq, nl_coeff, pulse_inv, bg_lines=64, bg_tol=0.005): #get_metrics() values without forming images
+        # Envelopes are evaluated only where get_metrics reads: wire search column & wire row,
+        # inner cyst box and evenly spaced A-lines of the background ROI (the separable PSF
+        # makes single rows / lines cheap). Background stats are estimated from those lines: starting
+        # at bg_lines, more lines are taken until the relative standard error of CNR & SNR (from the
+        # line-to-line spread) is <= bg_tol in both images; if that needs every line, full frames.
+        # The dB reference (frame max) comes from patches around the wires, the brightest reflectors.
+        if self.phantom is None:
+            self.create_phantom()
+        wires = [r for r, inc in zip(self.regions, self.phantom_def.inclusions)
+                 if inc['type'] == 'wire' and r[0] < r[1] and r[2] < r[3]] #out-of-grid wires have empty regions
+        if not self._wires_dominate(wires): #no obvious frame maximum -> full path
+            return self.simulate(freq, nl_coeff, pulse_inv)[2]
+        n = self.grid_size
+        margin = 30
+        bg_rows, lines = slice(margin, n - margin), np.arange(margin, n - margin)
+        lines = lines[np.abs(lines - n // 2) >= 15] #center band is excluded from the background anyway
+        cysts = self._cysts()
+        stride = max(1, len(lines) // bg_lines)
+        if cysts and stride < 4: #lines would cover over a quarter of the ROI: full frames cost about the same
+            return self.simulate(freq, nl_coeff, pulse_inv)[2]
+
+        ref_max, factors = {}, {}
+        for mode in ('fundamental', 'harmonic'):
+            factors[mode] = self._separable_kernels(mode, freq, nl_coeff, pulse_inv)
+            halo_r, halo_c = factors[mode][0].shape[1] // 2, factors[mode][1].shape[1] // 2 #PSF half size (axial, lateral)
+            peaks = [self._sparse_envelope(mode, nl_coeff, pulse_inv, factors[mode],
+                                           np.arange(max(r0 - halo_r, 0), min(r1 + halo_r, n)),
+                                           np.arange(max(c0 - halo_c, 0), min(c1 + halo_c, n))).max()
+                     for r0, r1, c0, c1 in wires]
+            ref_max[mode] = max(peaks)
+
+        bg_db = {} #(mode, col) -> dB A-line over bg_rows, kept while more lines are added
+
+        def sample(mode, rows, cols):
+            if rows is bg_rows and isinstance(cols, np.ndarray): #background lines
+                todo = [c for c in cols if (mode, c) not in bg_db]
+                if todo:
+                    env = self._sparse_envelope(mode, nl_coeff, pulse_inv, factors[mode], rows, np.array(todo))
+                    bg_db.update(((mode, c), line) for c, line in zip(todo, self.log_compress(env, ref_max[mode]).T))
+                return np.stack([bg_db[mode, c] for c in cols], axis=1)
+            env = self._sparse_envelope(mode, nl_coeff, pulse_inv, factors[mode], rows, cols)
+            return self.log_compress(env, ref_max[mode])
+
+        if cysts:
+            cyst_stats = {mode: self._cyst_stats(sample, mode, cysts[0]) for mode in ('fundamental', 'harmonic')}
+            err = self._background_error(sample, cyst_stats, bg_rows, lines[::stride])
+            while err > bg_tol:
+                stride = int(stride * (bg_tol / err)**2) #standard error ~ 1/sqrt(lines)
+                if stride <= 1: #every line needed -> full frames are cheaper (and exact)
+                    return self.simulate(freq, nl_coeff, pulse_inv)[2]
+                err = self._background_error(sample, cyst_stats, bg_rows, lines[::stride])
+        return self._frame_metrics(sample, bg_rows, lines[::stride])
+
+    def _wires_dominate(self, wires): #brightest wire holds the phantom maximum and nothing else is as bright
+        if not wires:
+            return False
+        outside = np.ones(self.phantom.shape, dtype=bool)
+        for r0, r1, c0, c1 in wires:
+            outside[r0:r1, c0:c1] = False
+        peak = self.phantom[~outside].max() #dimmer wires are fine: ref_max is taken over all wire patches
+        return not np.any(self.phantom[outside] >= peak) #e.g. faint wires under a bright layer
+
+    def _separable_kernels(self, mode, freq, nl_coeff, pulse_inv):
+        # _imaging_kernels in separable form: pulses (K, kh), distinct beams (B, kw), beam index per kernel
+        pulse, beam = self._psf_factors_cached(mode, freq, nl_coeff)
+        pulses, beams, beam_of = [pulse], [beam], [0]
+        if mode == "harmonic":
+            f_pulse, f_beam = self._psf_factors_cached("fundamental", freq, nl_coeff)
+            norm = np.sum(np.abs(f_pulse)) * np.sum(np.abs(f_beam)) + 1e-9
+            shift_px = self.pi_motion_m / (self.depth_m / (self.grid_size - 1))
+            if not pulse_inv:
+                pulses.append(f_pulse / norm)
+                beam_of.append(1)
+            else:
+                pulses[0] = pulse + self._psf_factors_cached(mode, freq, nl_coeff, shift_px)[0]
+                if shift_px: #fundamentals cancel exactly without motion
+                    pulses += [f_pulse / norm, self._psf_factors_cached("fundamental", freq, nl_coeff, shift_px)[0] / norm]
+                    beam_of += [1, 1]
+            if len(pulses) > 1:
+                beams.append(f_beam) #leakage / PI fundamentals share the fundamental beam
+        return np.stack(pulses), np.stack(beams), beam_of
+
+    def _sparse_envelope(self, mode, nl_coeff, pulse_inv, factors, rows, cols): #envelope at [rows, cols] only (outer indexing)
+        axis_r, axis_c = np.arange(self.grid_size)[rows], np.arange(self.grid_size)[cols]
+        r, c = np.atleast_1d(axis_r), np.atleast_1d(axis_c)
+        pulses, beams, beam_of = factors
+        kh, kw = pulses.shape[1], beams.shape[1]
+        # separable 'valid' convolution on the padded phantom: the first pass only at the requested
+        # depths (or lines), over the span the second pass needs; cheaper order first
+        if len(r) * kh * (c.max() - c.min() + kw) < len(c) * kw * (r.max() - r.min() + kh): #few depths, e.g. a row
+            lo = c.min()
+            taps = self._padded_phantom((kh, kw))[r[:, None] + np.arange(kh), lo:c.max() + kw] #(depths, kh, cols)
+            axial = pulses[:, ::-1] @ taps #(depths, K, cols)
+            fields = np.stack([correlate1d(axial[:, k], beams[beam_of[k], ::-1], axis=-1, mode='constant',
+                                           origin=-(kw // 2))[:, c - lo] for k in range(len(pulses))])
+        else: #few lines: transposed phantom, so lines are contiguous
+            lo = r.min()
+            taps = self._padded_phantom_t((kh, kw))[c[:, None] + np.arange(kw), lo:r.max() + kh] #(lines, kw, depths)
+            lateral = beams[:, ::-1] @ taps #(lines, beams, depths): one pass per distinct beam
+            fields = np.stack([correlate1d(lateral[:, beam_of[k]], pulses[k, ::-1], axis=-1, mode='constant',
+                                           origin=-(kh // 2))[:, r - lo] for k in range(len(pulses))])
+            fields = fields.transpose(0, 2, 1)
+
+        noise = self._buffer('noise', self.phantom.shape, self._noise_field)[np.ix_(r, c)]
+        noise_inv = self._buffer('noise_inv', self.phantom.shape, self._noise_field_inv)[np.ix_(r, c)] if pulse_inv else None
+        envelope = self._form_envelope(mode, nl_coeff, pulse_inv, fields, noise, noise_inv, r)
+        return envelope.reshape(np.shape(axis_r) + np.shape(axis_c))
+
+    def _padded_phantom_t(self, k_shape): #transposed copy of _padded_phantom (lateral taps read contiguous lines)
+        padded = self._padded_phantom(k_shape)
+        if self._padded_t is None or self._padded_t[0] is not padded:
+            self._padded_t = (padded, np.ascontiguousarray(padded.T))
+        return self._padded_t[1]
+
+    def snapshot_state(self): #-> (arrays, params) for Session_Snapshot.save_snapshot
+        arrays = {
+            'phantom': self.phantom,
+            'label_map': self.label_map,
+            'fundamental_img': self.fundamental_img,
+            'harmonic_img': self.harmonic_img,
+        }
+        for mode, img in self.compound_imgs.items():
+            arrays[f'compound_{mode}'] = img
+        params = {
+            'grid_size': self.grid_size,
+            'pi_motion_m': self.pi_motion_m,
+            'phantom': self.phantom_def.to_config(),
+            'regions': [list(map(int, r)) for r in self.regions],
+        }
+        return arrays, params
+
+    def restore_state(self, arrays, params): #adopt snapshot arrays as-is (memory-mapped, no recompute)
+        # everything is validated before the first assignment, so a bad snapshot leaves the state untouched
+        if params['grid_size'] != self.grid_size:
+            raise ValueError(f"Snapshot grid {params['grid_size']} does not match simulator grid {self.grid_size}")
+        phantom_def = PhantomDefinition(params['phantom'])
+        regions = [tuple(r) for r in params['regions']]
+        if len(regions) != len(phantom_def.inclusions):
+            raise ValueError("Snapshot regions do not match its phantom definition")
+        for name in ('phantom', 'label_map'):
+            if arrays[name].shape != (self.grid_size, self.grid_size):
+                raise ValueError(f"Snapshot {name} has shape {arrays[name].shape}, expected {(self.grid_size,) * 2}")
+        cyst_map = phantom_def.cyst_mask(arrays['label_map'], self.x, self.z, regions)
+
+        self.phantom_def = phantom_def
+        self.pi_motion_m = params.get('pi_motion_m', 0.0)
+        self.regions = regions
+        self.phantom = arrays['phantom']
+        self.label_map = arrays['label_map']
+        self.cyst_map = cyst_map
+        self.fundamental_img = arrays.get('fundamental_img')
+        self.harmonic_img = arrays.get('harmonic_img')
+        self.compound_imgs = {mode: arrays[f'compound_{mode}'] for mode in ('fundamental', 'harmonic')
+                              if f'compound_{mode}' in arrays}
+
     def get_profiles(self, freq_hz, nonlinear_coeff): #generates depth profiles for graphs
         z = np.linspace(0, 6, 200)  # depth in cm
-        f_MHz = freq_hz / 1e6
-        alpha = 0.5  # Attenuation coeff
-
-        #Fundamental
-        fund = np.exp(-(2 * alpha * f_MHz * z) / 8.686) #exponential attenuation with depth
-        fund /= np.max(fund) # normalize to 1
-
-        #Harmonic
-        # 1. Growth: according to: nl_coeff, freq, z 
-        beta_effect = nonlinear_coeff * 2.0 
-        growth = beta_effect * (f_MHz * 0.5) * z
-        # 2. Decay: higher freq, faster attenuation
-        decay = np.exp(-(2 * alpha * (2 * f_MHz) * z) / 8.686)
-        harm = growth * decay
-        harm_scale_factor = 0.6 + (nonlinear_coeff * 0.8)
-
-        # Normalize shape then apply scale
-        if np.max(harm) > 0:
-            harm = (harm / np.max(harm)) * harm_scale_factor
-        
+        fund, harm = depth_profiles(np.asarray(freq_hz / 1e6), np.asarray(nonlinear_coeff), z)
         return z, fund, harm
 
-    def get_metrics(self):
-        metrics = {}
-        center_x = self.grid_size // 2
-        true_z_px = int((self.wire_depth_m / self.depth_m) * self.grid_size) #25mm
+    def get_profile_atlas(self, freqs_hz, nonlinear_coeffs): #profiles + summary maps for every (freq, nl) pair
+        freqs = np.asarray(freqs_hz, dtype=float)
+        nls = np.asarray(nonlinear_coeffs, dtype=float)
+        key = (freqs.tobytes(), nls.tobytes())
+        if key in self._atlas_cache:
+            return self._atlas_cache[key]
 
-        #1. Analyze Wire Target (Sub-pixel Resolution) -> FWHM & SideLobes
-        def analyze_wire(img):
-            search_window = img[true_z_px-15:true_z_px+15, center_x]
-            peak_idx = np.argmax(search_window)
-            detected_z_px = (true_z_px - 15) + peak_idx #actual wire location
-    
-            row_db = img[detected_z_px, :] #get the row at wire depth
-            row_lin = 10**(row_db/20)
-            row_lin /= np.max(row_lin)  #linearize it back from dB
-            
-            # Sub-pixel FWHM(Full width at half Max) Calculation
-            peak_x = np.argmax(row_lin)
-            
-            # Find left crossing (left from peak until below 0.5)
-            left_idx = 0
-            for i in range(peak_x, 0, -1):
-                if row_lin[i] < 0.5:
-                    left_idx = i
-                    break
-            
-            if left_idx < peak_x:
-                y1 = row_lin[left_idx]
-                y2 = row_lin[left_idx+1]
-                exact_left = left_idx + (0.5 - y1) / (y2 - y1 + 1e-9)#linear interpolation for accuracy
-            else:
-                exact_left = peak_x - 0.5 
-
-            # Find right crossing (right from peak until below 0.5)
-            right_idx = len(row_lin) - 1
-            for i in range(peak_x, len(row_lin)):
-                if row_lin[i] < 0.5:
-                    right_idx = i
-                    break
-            
-            if right_idx > peak_x:
-                y1 = row_lin[right_idx-1]
-                y2 = row_lin[right_idx]
-                exact_right = (right_idx-1) + (0.5 - y1) / (y2 - y1 + 1e-9) #linear interpolation for accuracy
-            else:
-                exact_right = peak_x + 0.5
-                
-            width_px = exact_right - exact_left # get the wire width in pixels 
-            width_mm = width_px * ((self.width_m * 1000) / self.grid_size) #convert to mm
-            
-            # Side Lobe Level
-            mask = np.ones(self.grid_size, dtype=bool)
-            mask[center_x-12:center_x+12] = False 
-            sl = np.max(img[detected_z_px, mask])
-            if sl < -55: sl = -60 #clamping at min -60dB
+        z = np.linspace(0, 6, 200)  # depth in cm (same axis as get_profiles)
+        # (F, 1, 1) x (1, N, 1) x (Z,) -> one broadcast evaluation of all F*N curve pairs
+        fund, harm = depth_profiles(freqs[:, None, None] / 1e6, nls[None, :, None], z)
+        fund = np.broadcast_to(fund, harm.shape) #fundamental does not depend on nl
+
+        # Crossover: first depth where the harmonic overtakes the fundamental (NaN if never)
+        above = harm >= fund
+        first = np.argmax(above, axis=-1)
+        crossover = np.where(above.any(axis=-1), z[first], np.nan)
+        peak = np.argmax(harm, axis=-1)
+
+        atlas = {
+            'z': z, 'freqs': freqs, 'nls': nls,
+            'fund': fund, 'harm': harm, #(F, N, Z)
+            'crossover_depth': crossover, #(F, N) [cm]
+            'peak_harm_depth': z[peak], #(F, N) [cm]
+            'peak_harm': np.take_along_axis(harm, peak[..., None], axis=-1)[..., 0],
+            'harm_gain': np.max(harm - fund, axis=-1), #best harmonic advantage over depth
+        }
+        if len(self._atlas_cache) >= 4:
+            self._atlas_cache.pop(next(iter(self._atlas_cache)))
+        self._atlas_cache[key] = atlas
+        return atlas
+
+    def get_metrics(self):
+        images = {'fundamental': self.fundamental_img, 'harmonic': self.harmonic_img}
+        sample = lambda mode, rows, cols: images[mode][outer_index(rows, cols)]
+        metrics = self._frame_metrics(sample, slice(None), slice(None))
+        
+        # 3. Spatial compounding: CNR/SNR of the compounded images and gain over single angle
+        cysts = self._cysts()
+        for prefix in ('fund', 'harm'):
+            mode = 'fundamental' if prefix == 'fund' else 'harmonic'
+            if cysts and mode in self.compound_imgs:
+                sample = lambda mode, rows, cols: self.compound_imgs[mode][outer_index(rows, cols)]
+                c_cnr, c_snr = self._contrast_stats(sample, mode, cysts[0], slice(None), slice(None))
+                metrics[f'{prefix}_cnr_compound'] = c_cnr
+                metrics[f'{prefix}_snr_compound'] = c_snr
+                metrics[f'{prefix}_cnr_gain'] = c_cnr / (metrics[f'{prefix}_cnr'] + 1e-9)
+                metrics[f'{prefix}_snr_gain'] = c_snr / (metrics[f'{prefix}_snr'] + 1e-9)
             
-            return width_mm, sl
+        return metrics
+
+    def _cysts(self):
+        return [i for i, inc in enumerate(self.phantom_def.inclusions) if inc['type'] == 'cyst']
 
-        f_res, f_sl = analyze_wire(self.fundamental_img)
-        h_res, h_sl = analyze_wire(self.harmonic_img)
+    def _frame_metrics(self, sample, bg_rows, bg_cols):
+        # sample(mode, rows, cols) -> dB values of that image at [rows, cols] (outer indexing),
+        # so the same measurements run on full images or on sparsely evaluated ones (simulate_metrics)
+        metrics = {}
+        f_res, f_sl = self._wire_stats(sample, 'fundamental')
+        h_res, h_sl = self._wire_stats(sample, 'harmonic')
         
         metrics['fund_fwhm'] = f_res
         metrics['harm_fwhm'] = h_res
@@ -225,43 +730,123 @@ class UltrasoundSimulator: #core simulation engine
         metrics['harm_sl'] = h_sl
         
         # 2. CNR & SNR 
-        if self.inner_cyst_masks:
-            c_mask = self.inner_cyst_masks[0] #inner region of first cyst
-            
-            b_mask = np.zeros((self.grid_size, self.grid_size), dtype=bool) #bg tissue mask
-            margin = 30
-            b_mask[margin:-margin, margin:-margin] = True
-            center_col = self.grid_size // 2
-            b_mask[:, center_col-15:center_col+15] = False 
-            
-            all_cysts = np.zeros((self.grid_size, self.grid_size), dtype=bool)
-            for m in self.cyst_masks:
-                all_cysts = np.logical_or(all_cysts, m)
-            b_mask = np.logical_and(b_mask, ~all_cysts)
-
-            def calc_stats(img_db):
-                img_lin = 10**(img_db/20)
-                
-                mu_c = np.mean(img_lin[c_mask])
-                mu_b = np.mean(img_lin[b_mask])
-                sig_c = np.std(img_lin[c_mask])
-                sig_b = np.std(img_lin[b_mask])
-                
-                # CNR: |μ_background - μ_cyst| / √(σ_background² + σ_cyst²)
-                denom = np.sqrt(sig_c**2 + sig_b**2)
-                cnr_val = np.abs(mu_b - mu_c) / (denom + 1e-9)
-                
-                # SNR: μ_background / σ_background  
-                snr_val = mu_b / (sig_b + 1e-9)
-                
-                return cnr_val, snr_val
-            
-            f_cnr, f_snr = calc_stats(self.fundamental_img)
-            h_cnr, h_snr = calc_stats(self.harmonic_img)
+        cysts = self._cysts()
+        if cysts:
+            f_cnr, f_snr = self._contrast_stats(sample, 'fundamental', cysts[0], bg_rows, bg_cols)
+            h_cnr, h_snr = self._contrast_stats(sample, 'harmonic', cysts[0], bg_rows, bg_cols)
             
             metrics['fund_cnr'] = f_cnr
             metrics['harm_cnr'] = h_cnr
             metrics['fund_snr'] = f_snr
             metrics['harm_snr'] = h_snr
+        return metrics
+
+    def _wire_stats(self, sample, mode): #1. Analyze Wire Target (Sub-pixel Resolution) -> FWHM & SideLobes
+        center_x = self.grid_size // 2
+        true_z_px = int((self.wire_depth_m / self.depth_m) * self.grid_size) #25mm
+        
+        search_window = sample(mode, slice(true_z_px-15, true_z_px+15), center_x)
+        peak_idx = np.argmax(search_window)
+        detected_z_px = (true_z_px - 15) + peak_idx #actual wire location
+
+        row_db = sample(mode, detected_z_px, slice(None)) #get the row at wire depth
+        row_lin = 10**(row_db/20)
+        row_lin /= np.max(row_lin)  #linearize it back from dB
+        
+        # Sub-pixel FWHM(Full width at half Max) Calculation
+        peak_x = np.argmax(row_lin)
+        
+        # Find left crossing (left from peak until below 0.5)
+        left_idx = 0
+        for i in range(peak_x, 0, -1):
+            if row_lin[i] < 0.5:
+                left_idx = i
+                break
+        
+        if left_idx < peak_x:
+            y1 = row_lin[left_idx]
+            y2 = row_lin[left_idx+1]
+            exact_left = left_idx + (0.5 - y1) / (y2 - y1 + 1e-9)#linear interpolation for accuracy
+        else:
+            exact_left = peak_x - 0.5 
+
+        # Find right crossing (right from peak until below 0.5)
+        right_idx = len(row_lin) - 1
+        for i in range(peak_x, len(row_lin)):
+            if row_lin[i] < 0.5:
+                right_idx = i
+                break
+        
+        if right_idx > peak_x:
+            y1 = row_lin[right_idx-1]
+            y2 = row_lin[right_idx]
+            exact_right = (right_idx-1) + (0.5 - y1) / (y2 - y1 + 1e-9) #linear interpolation for accuracy
+        else:
+            exact_right = peak_x + 0.5
             
-        return metrics
\ No newline at end of file
+        width_px = exact_right - exact_left # get the wire width in pixels 
+        width_mm = width_px * ((self.width_m * 1000) / self.grid_size) #convert to mm
+        
+        # Side Lobe Level
+        mask = np.ones(self.grid_size, dtype=bool)
+        mask[center_x-12:center_x+12] = False 
+        sl = np.max(row_db[mask])
+        if sl < -55: sl = -60 #clamping at min -60dB
+        
+        return width_mm, sl
+
+    def _background_mask(self, rows, cols): #bg tissue mask at [rows, cols]
+        axis = np.arange(self.grid_size)
+        margin = 30
+        inside = (axis >= margin) & (axis < self.grid_size - margin)
+        center_col = self.grid_size // 2
+        lateral = inside & ((axis < center_col-15) | (axis >= center_col+15)) #without the center band
+        b_mask = inside[rows][:, None] & lateral[cols][None, :]
+        b_mask &= ~self.cyst_map[outer_index(rows, cols)] #exclude all cysts
+        return b_mask
+
+    def _cyst_stats(self, sample, mode, cyst): #mean & std inside the inner 50% rad of the cyst, None if empty
+        (r0, r1, c0, c1), inner = self.inclusion_mask(cyst, 0.5)
+        if not inner.any(): #sub-pixel cyst
+            return None
+        rr, cc = np.nonzero(inner) #crop to the inner circle (same pixels, smaller region to sample)
+        inner = inner[rr.min():rr.max() + 1, cc.min():cc.max() + 1]
+        r0, r1, c0, c1 = r0 + rr.min(), r0 + rr.max() + 1, c0 + cc.min(), c0 + cc.max() + 1
+        return self.backend.region_stats(sample(mode, slice(r0, r1), slice(c0, c1)), inner)
+
+    def _background_error(self, sample, cyst_stats, bg_rows, bg_cols): #worst relative standard error of CNR / SNR
+        # from the sampled lines as clusters: linearized (delta method) per-line residuals of each ratio
+        b_mask = self._background_mask(bg_rows, bg_cols)
+        counts = b_mask.sum(axis=0)
+        if np.count_nonzero(counts) < 2:
+            return np.inf #too little background in the sample -> refine
+        worst = 0.0
+        for mode in ('fundamental', 'harmonic'):
+            vals = np.where(b_mask, 10**(sample(mode, bg_rows, bg_cols) / 20), 0)
+            s1, s2, total = vals.sum(axis=0), (vals**2).sum(axis=0), counts.sum()
+            mu = s1.sum() / total
+            var = s2.sum() / total - mu**2
+            d_mu, d_var = s1 - mu*counts, s2 - 2*mu*s1 + (mu**2 - var)*counts
+            for mu_c, sig_c in [(0.0, 0.0)] + ([cyst_stats[mode]] if cyst_stats[mode] else []): #SNR, CNR
+                diff, spread = mu - mu_c, np.sqrt(sig_c**2 + var)
+                resid = np.sign(diff)*d_mu/spread - diff*d_var/(2*spread**3)
+                se = np.sqrt(np.sum(resid**2) * len(counts) / (len(counts) - 1)) / total
+                worst = max(worst, se / (abs(diff) / spread + 1e-12))
+        return worst
+
+    def _contrast_stats(self, sample, mode, cyst, bg_rows, bg_cols): #linearize & reduce on the compute backend
+        cyst_stats = self._cyst_stats(sample, mode, cyst)
+        b_mask = self._background_mask(bg_rows, bg_cols)
+        if cyst_stats is None or not b_mask.any(): #sub-pixel cyst / no background left -> undefined
+            return np.nan, np.nan
+        mu_c, sig_c = cyst_stats
+        mu_b, sig_b = self.backend.region_stats(sample(mode, bg_rows, bg_cols), b_mask)
+        
+        # CNR: |μ_background - μ_cyst| / √(σ_background² + σ_cyst²)
+        denom = np.sqrt(sig_c**2 + sig_b**2)
+        cnr_val = np.abs(mu_b - mu_c) / (denom + 1e-9)
+        
+        # SNR: μ_background / σ_background  
+        snr_val = mu_b / (sig_b + 1e-9)
+        
+        return cnr_val, snr_val
@@ -1,4 +1,6 @@
 import sys
+import argparse
+import numpy as np
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
@@ -8,12 +10,25 @@ from Metrics_Widget import MetricsWidget
 from Control_Panel import ControlPanel
 from Profile_Plot_Widget import ProfilePlotWidget
 from Ultrasound_Simulator import UltrasoundSimulator
+from Simulation_Server import SimulationClient
+from Compute_Backends import available_backends
+from Latency_Monitor import LatencyMonitor
+from Session_Snapshot import save_snapshot, load_snapshot
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, phantom_path=None, server=None, buffer_pool=False, backend='auto', pi_motion_um=0.0):
         super().__init__()
         
-        self.simulator = UltrasoundSimulator()
+        if server: #shared simulation service (phantom is defined on the server side)
+            self.simulator = SimulationClient(server)
+        else:
+            self.simulator = UltrasoundSimulator(buffer_pool=buffer_pool, backend=backend)
+            self.simulator.pi_motion_m = pi_motion_um * 1e-6 #tissue motion between PI transmits
+            if phantom_path:
+                self.simulator.load_phantom(phantom_path) #JSON / YAML inclusions
+        
+        self.latency = LatencyMonitor(budget_ms=250.0) #slider-to-pixel latency
+        self.last_frame = {} #what is on screen: images, profiles, metrics (for snapshots)
         
         # Timer
         self.timer = QTimer()
@@ -124,6 +139,10 @@ class MainWindow(QMainWindow):
         profile_layout = QVBoxLayout(profile_container)
         profile_layout.setContentsMargins(10, 10, 10, 10)
         self.plot_profile = ProfilePlotWidget()
+        #every slider position precomputed once -> slider ticks become table lookups
+        freqs = np.arange(self.controls.freq_slider.minimum(), self.controls.freq_slider.maximum() + 1) / 10.0 * 1e6
+        nls = np.arange(self.controls.nl_slider.minimum(), self.controls.nl_slider.maximum() + 1) / 100.0
+        self.plot_profile.set_atlas(self.simulator.get_profile_atlas(freqs, nls))
         profile_layout.addWidget(self.plot_profile)
         right.addWidget(profile_container, stretch=2)
         
@@ -140,43 +159,143 @@ class MainWindow(QMainWindow):
         self.controls.freq_slider.valueChanged.connect(self.schedule_update)
         self.controls.nl_slider.valueChanged.connect(self.schedule_update)
         self.controls.pi_check.stateChanged.connect(self.schedule_update)
+        self.controls.scan_check.stateChanged.connect(self.schedule_update)
+        self.controls.compound_check.stateChanged.connect(self.schedule_update)
+        self.controls.scan_check.setEnabled(hasattr(self.simulator, 'scan_frame')) #not offered by the server client
+        self.controls.compound_check.setEnabled(hasattr(self.simulator, 'run_compound'))
+        
+        #latency tracking: paint completion of the image canvas closes a sample
+        self.canvas_compare.paint_callbacks.append(self.on_frame_painted)
+        self.controls.latency_btn.clicked.connect(self.export_latency)
+        self.controls.save_btn.clicked.connect(self.save_session)
+        self.controls.load_btn.clicked.connect(self.load_session)
 
     def schedule_update(self): #calling update_graphs&timer
+        self.latency.mark_input()
         self.controls.setStatusUpdating()
         self.update_graphs()
+        self.latency.mark_stage('profiles')
         self.timer.start()
+    
+    def on_frame_painted(self):
+        if self.latency.mark_painted() is not None:
+            self.controls.setLatency(self.latency.percentiles(), self.latency.budget_ms)
+    
+    def export_latency(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Latency Histogram", "latency.csv",
+                                              "CSV (*.csv);;PNG image (*.png)")
+        if path:
+            self.latency.export_histogram(path)
         
     def update_graphs(self): #slider values + get_profiles --> re-plot profiles
         freq = (self.controls.freq_slider.value() / 10.0) * 1e6
         nl_coeff = self.controls.nl_slider.value() / 100.0
         
-        z, fund, harm = self.simulator.get_profiles(freq, nl_coeff) #z here refers to depth
-        self.plot_profile.plot_profiles(z, fund, harm)
+        profile = self.plot_profile.show_profile(freq, nl_coeff) #atlas lookup
+        if profile is None:
+            profile = self.simulator.get_profiles(freq, nl_coeff)
+            self.plot_profile.plot_profiles(*profile)
+        z, fund, harm = profile #z here refers to depth
+        self.last_frame.update(profile_z=z, profile_fund=fund, profile_harm=harm)
 
     def run_simulation(self): #slider values + pi  --> create phantoms & graphs & metrics
         freq = (self.controls.freq_slider.value() / 10.0) * 1e6
         nl_coeff = self.controls.nl_slider.value() / 100.0
         pi = self.controls.pi_check.isChecked() #pi here refers to pulse inversion
+        self.latency.mark_stage('debounce')
         
-        #Phantom
-        self.simulator.create_phantom()
-        
-        #img Physics
-        fund_img = self.simulator.run_imaging('fundamental', freq, nl_coeff, pi) #img to be plotted
-        harm_img = self.simulator.run_imaging('harmonic', freq, nl_coeff, pi) #img to be plotted
+        if self.controls.scan_check.isChecked() and self.controls.scan_check.isEnabled():
+            fund_img, harm_img, stats = self.run_scan(freq, nl_coeff, pi)
+        else:
+            #Phantom + img Physics + Metrics (in-process or on the simulation server)
+            try:
+                if self.controls.compound_check.isChecked() and self.controls.compound_check.isEnabled():
+                    fund_img, harm_img, stats = self.simulator.simulate(freq, nl_coeff, pi, compound_angles=(-10.0, 0.0, 10.0))
+                else:
+                    fund_img, harm_img, stats = self.simulator.simulate(freq, nl_coeff, pi) #imgs to be plotted
+            except (OSError, RuntimeError) as e: #server down / server-side error: keep the last frame
+                self.controls.setStatusError(f"Simulation failed: {e}")
+                return
+            self.latency.mark_stage('simulation')
         
         #Graphs
         self.canvas_compare.plot_comparison(fund_img, harm_img)
+        self.latency.mark_stage('draw_images')
         self.update_graphs()
+        self.latency.mark_stage('draw_profiles')
         
         #Metrics
-        stats = self.simulator.get_metrics()
         self.metrics.update_metrics(stats)
+        self.last_frame.update(display_fund=fund_img, display_harm=harm_img, metrics=stats)
         
         self.controls.setStatusReady()
+        self.latency.arm() #canvas paint completes the sample
+
+    def save_session(self): #parameters + phantom + images + profiles + metrics in one file
+        path, chosen = QFileDialog.getSaveFileName(self, "Save Snapshot", "session.ussnap",
+                                                   "Snapshot (*.ussnap);;Compressed snapshot (*.ussnapz)")
+        if not path or 'metrics' not in self.last_frame:
+            return
+        arrays, params = {}, {}
+        if hasattr(self.simulator, 'snapshot_state'): #in-process simulator: phantom & raw images too
+            arrays, params = self.simulator.snapshot_state()
+        for key in ('display_fund', 'display_harm', 'profile_z', 'profile_fund', 'profile_harm'):
+            arrays[key] = self.last_frame[key]
+        params.update(freq_value=self.controls.freq_slider.value(), nl_value=self.controls.nl_slider.value(),
+                      pi=self.controls.pi_check.isChecked(), compound=self.controls.compound_check.isChecked())
+        save_snapshot(path, arrays, params, self.last_frame['metrics'], compressed='Compressed' in chosen)
+    
+    def load_session(self): #repaint from the snapshot without running the simulation
+        path, _ = QFileDialog.getOpenFileName(self, "Load Snapshot", "", "Snapshots (*.ussnap *.ussnapz);;All files (*)")
+        if not path:
+            return
+        keys = ('display_fund', 'display_harm', 'profile_z', 'profile_fund', 'profile_harm')
+        try: #not a snapshot / truncated / other grid -> report and keep the current session
+            snap = load_snapshot(path)
+            arrays, params = snap['arrays'], snap['params']
+            frame = {key: arrays[key] for key in keys}
+            frame['metrics'] = snap['metrics']
+            controls = (int(params['freq_value']), int(params['nl_value']), bool(params['pi']), bool(params.get('compound', False)))
+            if hasattr(self.simulator, 'restore_state') and 'phantom' in arrays:
+                self.simulator.restore_state(arrays, params)
+        except Exception as e:
+            QMessageBox.warning(self, "Load Snapshot", f"Could not load {path}:\n{type(e).__name__}: {e}")
+            return
+        self.timer.stop()
+        self.controls.setParameters(*controls)
+        
+        self.canvas_compare.plot_comparison(frame['display_fund'], frame['display_harm'])
+        freq, nl_coeff = controls[0] / 10.0 * 1e6, controls[1] / 100.0
+        if self.plot_profile.show_profile(freq, nl_coeff) is None: #atlas marker follows the restored sliders
+            self.plot_profile.plot_profiles(frame['profile_z'], frame['profile_fund'], frame['profile_harm'])
+        self.metrics.update_metrics(frame['metrics'])
+        self.last_frame = frame
+        self.controls.setStatusReady()
+    
+    def run_scan(self, freq, nl_coeff, pi): #scan-line mode: stream column blocks to the canvas
+        n = self.simulator.grid_size
+        self.canvas_compare.begin_scan((n, n))
+        f_max = h_max = 0.0 #running reference for the provisional display
+        for c0, c1, f_env, h_env in self.simulator.scan_frame(freq, nl_coeff, pi, block_cols=32):
+            f_max, h_max = max(f_max, f_env.max()), max(h_max, h_env.max())
+            self.canvas_compare.update_scan(c0, c1, self.simulator.log_compress(f_env, f_max),
+                                            self.simulator.log_compress(h_env, h_max))
+        self.latency.mark_stage('simulation')
+        #final frame is normalized to the whole image, like run_imaging
+        return self.simulator.fundamental_img, self.simulator.harmonic_img, self.simulator.get_metrics()
 
 def main():
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Harmonic vs Fundamental US Simulator")
+    parser.add_argument('--phantom', help="JSON/YAML phantom definition (default: built-in phantom)")
+    parser.add_argument('--server', help="use a running Simulation_Server, e.g. 127.0.0.1:8765 or unix:/tmp/us_sim.sock")
+    parser.add_argument('--buffer-pool', action='store_true', help="reuse preallocated per-shape buffers for every frame (lower peak memory; separable 1D passes on the CPU instead of the selected --backend, usually a bit slower)")
+    parser.add_argument('--backend', default='auto', choices=['auto'] + available_backends(),
+                        help="compute backend (auto = fastest verified backend for the grid size)")
+    parser.add_argument('--pi-motion-um', type=float, default=0.0,
+                        help="axial tissue motion between the two pulse-inversion transmits (micrometers)")
+    args, qt_args = parser.parse_known_args()
+    
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setStyle('Fusion')
     
     #color palette
@@ -196,7 +315,8 @@ def main():
     palette.setColor(QPalette.HighlightedText, QColor(255, 255, 255))
     app.setPalette(palette)
     
-    win = MainWindow()
+    win = MainWindow(phantom_path=args.phantom, server=args.server, buffer_pool=args.buffer_pool, backend=args.backend,
+                     pi_motion_um=args.pi_motion_um)
     win.show()
     sys.exit(app.exec_())
 